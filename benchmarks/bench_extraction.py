@@ -0,0 +1,248 @@
+"""
+字段提取基准测试
+功能：对比重构前逐模式 re.search 的解析与预编译提取引擎的吞吐量（页/秒），
+      并逐字段校验两者输出完全一致
+
+用法: python benchmarks/bench_extraction.py [--variants 20] [--rounds 5]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.corpus import build_corpus  # noqa: E402
+from invoice_ocr.parsing import parse_enhanced  # noqa: E402
+
+
+# -------------------------- 重构前的实现 --------------------------
+def legacy_extract_with_multiple_patterns(text, patterns):
+    """使用多个模式尝试提取，返回第一个成功匹配的结果"""
+    for pattern in patterns:
+        match = re.search(pattern, text)
+        if match:
+            return match.group(1).strip()
+    return ""
+
+
+def legacy_parse_invoice_text_enhanced(text, page_num):
+    """重构前的增强版解析（逐字段、逐模式 re.search），作为输出一致性的基准"""
+    parsed_data = {
+        "票据序号": page_num + 1,
+        "票据类型": "",
+        "发票代码": "",
+        "发票号码": "",
+        "开票日期": "",
+        "购买方名称": "",
+        "购买方统一信用代码": "",
+        "销售方名称": "",
+        "销售方统一信用代码": "",
+        "项目名称": "",
+        "金额（不含税）": 0.0,
+        "税率(%)": 0.0,
+        "税额": 0.0,
+        "价税合计": 0.0,
+        "备注": ""
+    }
+
+    # 1. 发票类型（更灵活的匹配）
+    if "增值税专用发票" in text:
+        parsed_data["票据类型"] = "增值税专用发票"
+    elif "增值税普通发票" in text:
+        parsed_data["票据类型"] = "增值税普通发票"
+    elif "电子发票" in text or "电子" in text:
+        parsed_data["票据类型"] = "电子发票"
+    elif "通用机打发票" in text:
+        parsed_data["票据类型"] = "通用机打发票"
+
+    # 2. 发票代码和号码
+    code_patterns = [
+        r'发票代码[：:]\s*(\d+)',
+        r'代码[：:]\s*(\d{12})',
+    ]
+    parsed_data["发票代码"] = legacy_extract_with_multiple_patterns(text, code_patterns)
+
+    no_patterns = [
+        r'发票号码[：:]\s*(\d+)',
+        r'号码[：:]\s*(\d{8})',
+    ]
+    parsed_data["发票号码"] = legacy_extract_with_multiple_patterns(text, no_patterns)
+
+    # 3. 开票日期
+    date_patterns = [
+        r'开票日期[：:]\s*(\d{4}年\d{1,2}月\d{1,2}日)',
+        r'开票日期[：:]\s*(\d{4}-\d{1,2}-\d{1,2})',
+        r'(\d{4}年\d{1,2}月\d{1,2}日)',
+    ]
+    parsed_data["开票日期"] = legacy_extract_with_multiple_patterns(text, date_patterns)
+
+    # 4. 购买方名称（更全面的模式）
+    buyer_patterns = [
+        r'购买方[\s\S]{0,50}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|密区码|$)',
+        r'购[\s\S]{0,30}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|$)',
+        r'客户名称[：:]\s*([^\n]+)',
+        r'抬头[：:]\s*([^\n]+)',
+        r'名称[：:]\s*([^\n]{2,20}?)(?=\s+纳税人识别号)',
+    ]
+    parsed_data["购买方名称"] = legacy_extract_with_multiple_patterns(text, buyer_patterns)
+
+    # 5. 销售方名称
+    seller_patterns = [
+        r'销售方[\s\S]{0,50}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|备注|$)',
+        r'销[\s\S]{0,30}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|$)',
+        r'销售商[：:]\s*([^\n]+)',
+        r'商家名称[：:]\s*([^\n]+)',
+    ]
+    parsed_data["销售方名称"] = legacy_extract_with_multiple_patterns(text, seller_patterns)
+
+    # 6. 购买方税号
+    buyer_tax_patterns = [
+        r'购买方[\s\S]{0,100}纳税人识别号[：:]\s*([A-Z0-9]{18,20})',
+        r'购买方[\s\S]{0,100}统一社会信用代码[：:]\s*([A-Z0-9]{18,20})',
+        r'客户[\s\S]{0,50}税号[：:]\s*([A-Z0-9]{18,20})',
+        r'纳税人识别号[：:]\s*([A-Z0-9]{18,20})',
+    ]
+    parsed_data["购买方统一信用代码"] = legacy_extract_with_multiple_patterns(text, buyer_tax_patterns)
+
+    # 7. 销售方税号
+    seller_tax_patterns = [
+        r'销售方[\s\S]{0,100}纳税人识别号[：:]\s*([A-Z0-9]{18,20})',
+        r'销售方[\s\S]{0,100}统一社会信用代码[：:]\s*([A-Z0-9]{18,20})',
+        r'销售商[\s\S]{0,50}税号[：:]\s*([A-Z0-9]{18,20})',
+    ]
+    parsed_data["销售方统一信用代码"] = legacy_extract_with_multiple_patterns(text, seller_tax_patterns)
+
+    # 8. 项目名称
+    item_patterns = [
+        r'\*[\u4e00-\u9fa5a-zA-Z0-9]+\*\s*([^\n]+?)(?=\s+规格型号|单位|数量|单价|$)',
+        r'货物或应税劳务[\s\S]{0,20}名称[：:]\s*([^\n]+)',
+        r'项目[：:]\s*([^\n]+)',
+        r'商品名称[：:]\s*([^\n]+)',
+        r'服务名称[：:]\s*([^\n]+)',
+        r'名称[：:]\s*([^\n]{2,30}?)(?=\s+规格型号|单位)',
+    ]
+    parsed_data["项目名称"] = legacy_extract_with_multiple_patterns(text, item_patterns)
+
+    # 9. 价税合计（最重要的字段）
+    total_patterns = [
+        r'价税合计[\s\S]{0,20}大写[）:]?\s*([^\n]+)',
+        r'价税合计[\s\S]{0,30}[小写][）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+        r'[（(]小写[）)]\s*[￥¥]?\s*([\d,]+\.?\d*)',
+        r'合计[）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+        r'总金额[）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+    ]
+    for pattern in total_patterns:
+        match = re.search(pattern, text)
+        if match:
+            amount_str = match.group(1).replace('¥', '').replace('￥', '').replace(',', '').strip()
+            # 过滤掉大写数字
+            if not any(c in amount_str for c in '壹贰叁肆伍陆柒捌玖拾佰仟万亿元整角分'):
+                try:
+                    parsed_data["价税合计"] = float(amount_str)
+                    break
+                except:
+                    pass
+
+    # 10. 税率
+    tax_rate_patterns = [
+        r'税率[】】]?\s*(\d+)%',
+        r'税率[：:]\s*(\d+)',
+    ]
+    for pattern in tax_rate_patterns:
+        match = re.search(pattern, text)
+        if match:
+            try:
+                parsed_data["税率(%)"] = float(match.group(1))
+                break
+            except:
+                pass
+
+    # 11. 税额
+    tax_patterns = [
+        r'税额[\s\S]{0,10}[）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+        r'税额[）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+    ]
+    for pattern in tax_patterns:
+        match = re.search(pattern, text)
+        if match:
+            tax_str = match.group(1).replace('¥', '').replace('￥', '').replace(',', '').strip()
+            try:
+                parsed_data["税额"] = float(tax_str)
+                break
+            except:
+                pass
+
+    # 12. 金额（不含税）
+    amount_patterns = [
+        r'金额[\s\S]{0,10}[不含税][）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+        r'金额[）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+        r'不含税金额[）:]?\s*[￥¥]?\s*([\d,]+\.?\d*)',
+    ]
+    for pattern in amount_patterns:
+        match = re.search(pattern, text)
+        if match:
+            amount_str = match.group(1).replace('¥', '').replace('￥', '').replace(',', '').strip()
+            try:
+                parsed_data["金额（不含税）"] = float(amount_str)
+                break
+            except:
+                pass
+
+    # 计算逻辑：如果只有部分数据，尝试计算
+    if parsed_data["价税合计"] > 0:
+        if parsed_data["税额"] == 0 and parsed_data["税率(%)"] > 0:
+            # 已知价税合计和税率，计算税额
+            parsed_data["税额"] = round(parsed_data["价税合计"] / (1 + parsed_data["税率(%)"]/100) * (parsed_data["税率(%)"]/100), 2)
+        if parsed_data["金额（不含税）"] == 0:
+            # 已知价税合计和税额，计算不含税金额
+            parsed_data["金额（不含税）"] = round(parsed_data["价税合计"] - parsed_data["税额"], 2)
+
+    return parsed_data
+
+
+# -------------------------- 基准测试 --------------------------
+def pages_per_second(parse, corpus, rounds):
+    """多轮解析整个语料，取最快一轮的吞吐量"""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for idx, text in enumerate(corpus):
+            parse(text, idx)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发票字段提取吞吐量")
+    parser.add_argument("--variants", type=int, default=20, help="每页生成的噪声变体数")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.variants)
+    print(f"语料共 {len(corpus)} 页")
+
+    mismatches = 0
+    for idx, text in enumerate(corpus):
+        expected = legacy_parse_invoice_text_enhanced(text, idx)
+        actual = parse_enhanced(text, idx)
+        if expected != actual:
+            mismatches += 1
+            diff = {k: (expected[k], actual[k]) for k in expected if expected[k] != actual[k]}
+            print(f"  [ERROR] 第 {idx + 1} 页输出不一致: {diff}")
+    if mismatches:
+        print(f"[ERROR] {mismatches} 页输出不一致")
+        return 1
+    print("[OK] 新旧实现输出完全一致")
+
+    legacy = pages_per_second(legacy_parse_invoice_text_enhanced, corpus, args.rounds)
+    engine = pages_per_second(parse_enhanced, corpus, args.rounds)
+    print(f"\n  逐模式 re.search : {legacy:>8.0f} 页/秒")
+    print(f"  预编译提取引擎   : {engine:>8.0f} 页/秒")
+    print(f"  提速 {engine / legacy:.2f} 倍")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
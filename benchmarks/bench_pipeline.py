@@ -0,0 +1,255 @@
+"""
+流水线吞吐基准测试
+功能：把固定的合成发票语料（synthetic_invoices.json）逐页走一遍 文本层/渲染 → OCR → 解析 → 导出，
+      统计各阶段单页耗时的 p50/p95、页/秒、峰值内存和字段正确率；再用 InvoiceProcessor 端到端
+      （进程池 + 解析流水线 + 流式Excel）跑一遍测整体吞吐。结果可保存为基准，之后每次运行与基准逐项对比，
+      变差超过容差的指标标记为回退
+
+--stub 使用桩OCR后端：按页面像素返回语料真值，不做推理，此时数字只反映渲染、解析、导出和框架开销；
+不加 --stub 时使用真实 PaddleOCR
+
+用法: python benchmarks/bench_pipeline.py [--stub] [--parser enhanced] [--zoom 3] [--repeat 3] [--workers 2]
+                                          [--save-baseline] [--baseline 基准文件] [--tolerance 0.1]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import ROOT_DIR, build_pdf, load_corpus, stub_backend  # noqa: E402
+from invoice_ocr import InvoiceProcessor, OCREngine  # noqa: E402
+from invoice_ocr.export import ExcelWriter  # noqa: E402
+from invoice_ocr.extraction import to_date  # noqa: E402
+from invoice_ocr.parsing import DEFAULT_PARSER, PARSERS, get_parser, parse_result  # noqa: E402
+from invoice_ocr.render import render_page  # noqa: E402
+from invoice_ocr.text_layer import extract_text_layer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, "benchmarks", "pipeline_baseline.json")
+STAGES = ("text_layer", "render", "ocr", "parse", "export")
+# 参与正确率统计的字段：(解析结果字段, 语料字段)
+CHECKED_FIELDS = [("发票号码", "number"), ("开票日期", "date"), ("价税合计", "total"),
+                  ("销售方统一信用代码", "seller_tax_id")]
+# 与基准对比的参数，不同时对比结果仅供参考
+COMPARED_SETTINGS = ("corpus", "backend", "parser", "zoom", "text_layer", "workers", "repeat")
+
+
+def percentile(values, pct):
+    """最近秩分位数；无样本时返回0"""
+    values = sorted(values)
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(pct / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def peak_rss_mb():
+    """本进程和已结束子进程的峰值常驻内存（MB）；无法获取时为None"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return {"self": None, "children": None}
+        return {"self": psutil.Process().memory_info().peak_wset / 2 ** 20, "children": None}
+
+    # Linux 下单位为KB，macOS 下为字节
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2 ** 20,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2 ** 20}
+
+
+def timed(samples, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    samples.append((time.perf_counter() - start) * 1000)
+    return result
+
+
+def field_accuracy(rows, invoices):
+    """各检查字段与语料真值一致的比例"""
+    total = same = 0
+    for row, invoice in zip(rows, invoices):
+        for field, key in CHECKED_FIELDS:
+            expected, actual = invoice[key], row.get(field)
+            if key == "date":
+                expected, actual = to_date(expected), to_date(actual)
+            elif key == "total":
+                actual = round(float(actual or 0), 2)
+            total += 1
+            same += int(actual == expected)
+    return same / total if total else 1.0
+
+
+def run_stages(pdf_path, backend, args, out_dir):
+    """单进程逐页执行各阶段，返回 (各阶段耗时列表, 解析结果, 总耗时秒, 保存Excel耗时毫秒)"""
+    timings = {stage: [] for stage in STAGES}
+    rows = []
+    with OCREngine(workers=1, zoom=args.zoom, use_text_layer=False, backend=backend) as engine, \
+            fitz.open(pdf_path) as doc:
+        next(engine.iter_images([render_page(doc[0], args.zoom)]))  # 预热：加载模型
+        report = ExcelWriter(os.path.join(out_dir, "stages.xlsx"), layout=args.parser)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for page in doc:
+                result = None
+                if not args.no_text_layer:
+                    result = timed(timings["text_layer"], extract_text_layer, page, args.zoom)
+                if result is None:
+                    img_array = timed(timings["render"], render_page, page, args.zoom)
+                    result = timed(timings["ocr"], lambda: next(engine.iter_images([img_array])))
+                row = timed(timings["parse"], parse_result, result, len(rows), args.parser)
+                timed(timings["export"], report.append, row)
+                rows.append(row)
+        save_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            report.close()
+        elapsed = time.perf_counter() - start
+    return timings, rows, elapsed, (time.perf_counter() - save_start) * 1000
+
+
+def run_end_to_end(pdf_path, backend, args, out_dir):
+    """InvoiceProcessor 端到端处理 repeat 遍语料，返回耗时（秒）；先跑一遍预热"""
+    with contextlib.redirect_stdout(io.StringIO()), \
+            InvoiceProcessor(parser=args.parser, workers=args.workers, zoom=args.zoom, cache_dir=None,
+                             use_text_layer=not args.no_text_layer, backend=backend) as processor:
+        processor.process_to_excel([pdf_path], os.path.join(out_dir, "warmup.xlsx"))
+        start = time.perf_counter()
+        processor.process_to_excel([pdf_path] * args.repeat, os.path.join(out_dir, "end_to_end.xlsx"))
+        return time.perf_counter() - start
+
+
+def collect(args):
+    corpus, corpus_hash = load_corpus()
+    invoices = corpus["invoices"]
+    with tempfile.TemporaryDirectory() as out_dir:
+        pdf_path = os.path.join(out_dir, "synthetic_invoices.pdf")
+        truth = build_pdf(pdf_path, corpus)
+        backend = stub_backend(pdf_path, truth, args.zoom, args.stub_ms_per_mp) if args.stub else None
+        pages = len(invoices) * args.repeat
+
+        print(f"语料: {len(invoices)} 页 × {args.repeat} 遍（{corpus_hash}），"
+              f"OCR后端: {'stub' if args.stub else 'PaddleOCR'}，解析规则: {args.parser}，缩放 {args.zoom}x")
+        print("逐页分阶段计时...")
+        timings, rows, elapsed, save_ms = run_stages(pdf_path, backend, args, out_dir)
+        print(f"端到端（InvoiceProcessor，{args.workers} 个OCR进程）...")
+        end_to_end = run_end_to_end(pdf_path, backend, args, out_dir)
+
+    rss = peak_rss_mb()
+    return {
+        "settings": {
+            "corpus": corpus_hash, "backend": "stub" if args.stub else "paddleocr", "parser": args.parser,
+            "zoom": args.zoom, "text_layer": not args.no_text_layer, "workers": args.workers, "repeat": args.repeat,
+            "python": platform.python_version(), "pymupdf": fitz.VersionBind, "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "stages": {stage: {"count": len(samples), "p50_ms": percentile(samples, 50), "p95_ms": percentile(samples, 95)}
+                   for stage, samples in timings.items()},
+        "export_save_ms": save_ms,
+        "pages_per_sec": pages / elapsed,
+        "end_to_end_pages_per_sec": pages / end_to_end,
+        "peak_rss_mb": rss["self"],
+        "peak_rss_children_mb": rss["children"],
+        "field_accuracy": field_accuracy(rows, invoices * args.repeat),
+    }
+
+
+def print_results(results):
+    print(f"\n{'阶段':<12}{'页数':>6}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for stage, stats in results["stages"].items():
+        if stats["count"]:
+            print(f"{stage:<12}{stats['count']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+    print(f"\n保存Excel: {results['export_save_ms']:.1f} ms")
+    print(f"逐页串行: {results['pages_per_sec']:.1f} 页/秒")
+    print(f"端到端:   {results['end_to_end_pages_per_sec']:.1f} 页/秒")
+    if results["peak_rss_mb"] is not None:
+        children = results["peak_rss_children_mb"]
+        print(f"峰值内存: {results['peak_rss_mb']:.0f} MB"
+              + (f"（OCR子进程 {children:.0f} MB）" if children else ""))
+    print(f"字段正确率: {results['field_accuracy']:.1%}")
+
+
+def _metrics(results):
+    """与基准对比的指标：名称 → (值, 越大越好)"""
+    metrics = {}
+    for stage, stats in results["stages"].items():
+        if stats["count"]:
+            metrics[f"{stage} p50(ms)"] = (stats["p50_ms"], False)
+            metrics[f"{stage} p95(ms)"] = (stats["p95_ms"], False)
+    metrics["逐页串行(页/秒)"] = (results["pages_per_sec"], True)
+    metrics["端到端(页/秒)"] = (results["end_to_end_pages_per_sec"], True)
+    if results["peak_rss_mb"] is not None:
+        metrics["峰值内存(MB)"] = (results["peak_rss_mb"], False)
+    metrics["字段正确率"] = (results["field_accuracy"], True)
+    return metrics
+
+
+def compare(results, baseline, tolerance):
+    """逐项对比基准，返回回退的指标数"""
+    changed = [key for key in COMPARED_SETTINGS if baseline["settings"].get(key) != results["settings"][key]]
+    print(f"\n与基准对比（{baseline['settings']['time']}，容差 {tolerance:.0%}）")
+    if changed:
+        print(f"[WARNING] 参数与基准不同（{', '.join(changed)}），对比仅供参考")
+
+    regressions = 0
+    current, previous = _metrics(results), _metrics(baseline)
+    print(f"{'指标':<20}{'基准':>10}{'本次':>10}{'变化':>9}")
+    for name, (value, higher_is_better) in current.items():
+        if name not in previous:
+            continue
+        old = previous[name][0]
+        change = (value - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = "  [回退]" if worse > tolerance else ""
+        regressions += bool(flag)
+        print(f"{name:<20}{old:>10.2f}{value:>10.2f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR与解析流水线吞吐基准")
+    parser.add_argument("--stub", action="store_true", help="使用桩OCR后端（不做推理）")
+    parser.add_argument("--stub-ms-per-mp", type=float, default=0.0, help="桩后端每百万像素模拟的推理毫秒数")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default=DEFAULT_PARSER)
+    parser.add_argument("--zoom", type=float, default=None, help="渲染缩放比例（默认按解析规则）")
+    parser.add_argument("--no-text-layer", action="store_true", help="原生PDF页也渲染并OCR")
+    parser.add_argument("--repeat", type=int, default=3, help="语料重复遍数")
+    parser.add_argument("--workers", type=int, default=2, help="端到端测试的OCR进程数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基准结果文件")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基准")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="变差超过该比例视为回退")
+    args = parser.parse_args()
+    args.zoom = args.zoom or get_parser(args.parser)["zoom"]
+
+    results = collect(args)
+    print_results(results)
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] 已保存基准: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n[ERROR] {regressions} 项指标比基准差 {args.tolerance:.0%} 以上")
+            status = 1
+        else:
+            print("\n[OK] 未发现回退")
+    else:
+        print(f"\n[WARNING] 没有基准结果（{args.baseline}），可加 --save-baseline 保存本次结果")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+渲染基准测试：PNG往返 vs 直接包装像素缓冲区
+功能：对比每页"渲染 → numpy数组"的耗时，并校验两种方式得到的像素完全一致
+
+用法: python benchmarks/bench_render.py [PDF路径] [--zoom 3] [--repeat 3]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from invoice_ocr.render import render_page, render_page_png  # noqa: E402
+
+DEFAULT_PDF = "../task1/345.pdf"
+
+
+def time_render(pdf_doc, render_func, zoom, repeat):
+    """对每页执行 repeat 次渲染，返回所有单页耗时（毫秒）"""
+    timings = []
+    for _ in range(repeat):
+        for page in pdf_doc:
+            start = time.perf_counter()
+            img_array = render_func(page, zoom)
+            img_array.sum(axis=None, dtype=np.uint64)  # 触发一次完整读取，模拟推理前的预处理
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="渲染到张量的耗时对比")
+    parser.add_argument("pdf", nargs="?", default=DEFAULT_PDF)
+    parser.add_argument("--zoom", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_doc = fitz.open(args.pdf)
+    print(f"PDF: {args.pdf}  共 {len(pdf_doc)} 页  缩放 {args.zoom}x  重复 {args.repeat} 次")
+
+    # 校验像素一致
+    for page in pdf_doc:
+        if not np.array_equal(render_page(page, args.zoom), render_page_png(page, args.zoom)):
+            print(f"[ERROR] 第 {page.number + 1} 页像素不一致")
+            return 1
+
+    results = [
+        ("PNG编码/解码", time_render(pdf_doc, render_page_png, args.zoom, args.repeat)),
+        ("直接包装", time_render(pdf_doc, render_page, args.zoom, args.repeat)),
+    ]
+    pdf_doc.close()
+
+    print(f"\n{'方式':<12}{'p50(ms)':>10}{'均值(ms)':>10}{'最大(ms)':>10}")
+    for name, timings in results:
+        print(f"{name:<12}{statistics.median(timings):>10.1f}"
+              f"{statistics.mean(timings):>10.1f}{max(timings):>10.1f}")
+
+    speedup = statistics.median(results[0][1]) / statistics.median(results[1][1])
+    print(f"\n[OK] 直接包装路径每页提速 {speedup:.1f} 倍")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
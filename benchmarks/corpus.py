@@ -0,0 +1,54 @@
+"""
+基准测试语料
+功能：从 ocr_raw_text_debug.txt 读取真实OCR页面文本，并生成打乱行序、插入噪声的变体，
+      供解析相关的基准测试共用
+"""
+
+import os
+import random
+import re
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEBUG_TEXT_FILE = os.path.join(ROOT_DIR, "ocr_raw_text_debug.txt")
+
+_PAGE_HEADER = re.compile(r'^===== 第\d+页 =====$', re.M)
+_SCORE_SUFFIX = re.compile(r'\s*\(置信度:[\d.]+\)$')
+_NOISE = list("口囗一丨丶ノ乙·.,:：;；|｜-—_~'\"“”[]【】()（）") + ["l", "I", "O", "0", " "]
+
+
+def load_debug_pages(path=DEBUG_TEXT_FILE):
+    """读取调试文件，返回每页的文本行列表"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    pages = []
+    for block in _PAGE_HEADER.split(content)[1:]:
+        lines = [_SCORE_SUFFIX.sub('', line).strip() for line in block.splitlines()]
+        pages.append([line for line in lines if line and line != "识别失败"])
+    return pages
+
+
+def noisy_variant(lines, rng):
+    """生成一页的噪声变体：随机交换相邻行、插入OCR噪声字符"""
+    lines = list(lines)
+    for _ in range(len(lines) // 4):
+        i = rng.randrange(len(lines) - 1)
+        lines[i], lines[i + 1] = lines[i + 1], lines[i]
+    noisy = []
+    for line in lines:
+        if rng.random() < 0.2:
+            pos = rng.randrange(len(line) + 1)
+            line = line[:pos] + rng.choice(_NOISE) + line[pos:]
+        noisy.append(line)
+    return noisy
+
+
+def build_corpus(variants=20, separator=" | ", seed=42):
+    """真实页面 + 每页 variants 个噪声变体，返回页面文本列表（按 separator 拼接）"""
+    rng = random.Random(seed)
+    pages = [p for p in load_debug_pages() if p]
+    corpus = [separator.join(lines) for lines in pages]
+    for lines in pages:
+        for _ in range(variants):
+            corpus.append(separator.join(noisy_variant(lines, rng)))
+    return corpus
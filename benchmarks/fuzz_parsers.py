@@ -0,0 +1,91 @@
+"""
+发票解析器模糊测试
+功能：向各解析器输入构造的对抗性OCR文本（超长空白、重复标签、无换行长行等）和随机噪声页面，
+      断言单页解析耗时有上界，并输出各用例耗时
+
+用法: python benchmarks/fuzz_parsers.py [--size 20000] [--random 200] [--limit 0.5]
+"""
+
+import argparse
+import functools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from invoice_ocr.parsing import PARSERS  # noqa: E402
+
+# 随机页面的组成片段：字段标签、金额、噪声字符
+_FRAGMENTS = [
+    "购买方", "销售方", "名称：", "名称:", "纳税人识别号：", "统一社会信用代码：", "税号：",
+    "价税合计", "（小写）", "合计", "金额", "税额", "税率", "13%", "¥", "￥", "1,234.56",
+    "*餐饮服务*", "*", "购", "销", "开票日期：", "2024年1月1日", "发票代码：", "发票号码：",
+    "91440300MA5XXXXXX1", " ", "  ", "\n", " | ", "口", "一", "l", "0", ":", "：",
+]
+
+
+def adversarial_cases(size):
+    """构造已知会让回溯型正则退化的输入"""
+    return {
+        "标签后超长空白": "税额" + " " * size + "x",
+        "小写金额后超长空白": "价税合计小写" + " " * size + "x",
+        "重复单字标签": "购" * size,
+        "重复名称标签无税号": "购买方名称：甲 " * (size // 8) + "\n",
+        "重复项目星号": "*a*" * (size // 3) + "\n",
+        "金额字符长行": "金额价税合计" * (size // 6),
+        "名称后大量短词": "购买方 名称：" + "x " * (size // 2) + "\n\n",
+        "名称后空白与换行交替": "销售方名称：甲" + " \n" * (size // 2) + "x",
+    }
+
+
+def random_pages(count, size, seed=42):
+    """由标签和噪声片段随机拼接的页面"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts, length = [], 0
+        while length < size:
+            part = rng.choice(_FRAGMENTS) * rng.choice((1, 1, 1, 2, 50))
+            parts.append(part)
+            length += len(part)
+        yield "".join(parts)
+
+
+def time_parse(parse, text):
+    start = time.perf_counter()
+    parse(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发票解析器模糊测试")
+    parser.add_argument("--size", type=int, default=20000, help="每页文本长度（字符）")
+    parser.add_argument("--random", type=int, default=200, help="随机页面数")
+    parser.add_argument("--limit", type=float, default=0.5, help="单页解析耗时上限（秒）")
+    args = parser.parse_args()
+
+    failures = 0
+    cases = adversarial_cases(args.size)
+    for name, spec in PARSERS.items():
+        print(f"\n{name}")
+        parse = functools.partial(spec["parse"], page_num=0)
+        for case, text in cases.items():
+            elapsed = time_parse(parse, text)
+            flag = "OK" if elapsed <= args.limit else "ERROR"
+            failures += flag == "ERROR"
+            print(f"  [{flag}] {case:<16} {elapsed * 1000:>8.1f} ms")
+
+        worst = max(time_parse(parse, text) for text in random_pages(args.random, args.size))
+        flag = "OK" if worst <= args.limit else "ERROR"
+        failures += flag == "ERROR"
+        print(f"  [{flag}] 随机页面 x{args.random:<8} 最慢 {worst * 1000:>8.1f} ms")
+
+    if failures:
+        print(f"\n[ERROR] {failures} 项超出单页耗时上限 {args.limit} 秒")
+        return 1
+    print(f"\n[OK] 所有用例单页解析均在 {args.limit} 秒内完成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+合成发票语料
+功能：按 synthetic_invoices.json（随仓库提交的固定语料）生成基准测试用的PDF：
+      digital 页为带文本层的原生PDF页，scan 页加噪声、轻微偏移旋转后栅格化为JPEG（没有文本层）；
+      同时提供桩OCR后端，按页面像素返回语料中的真实文本，不做推理
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_FILE = os.path.join(ROOT_DIR, "benchmarks", "synthetic_invoices.json")
+
+PAGE_WIDTH, PAGE_HEIGHT = 680, 400  # 与 layout.TEMPLATES["vat"] 的区域划分一致
+FONT_SIZE = 9
+SCAN_ZOOM = 2.5  # 扫描页的栅格化分辨率（约180dpi）
+SCAN_QUALITY = 80  # 扫描页JPEG质量
+
+
+def load_corpus(path=CORPUS_FILE):
+    """读取语料，返回 (语料内容, 内容哈希)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return json.loads(data), hashlib.sha256(data).hexdigest()[:16]
+
+
+def invoice_lines(invoice):
+    """一张发票的文本行：[(x, y, 文本)]，每行对应OCR结果中的一个文本片段"""
+    lines = [(230, 30, invoice["type"])]
+    if invoice["code"]:
+        lines.append((452, 22, f"发票代码：{invoice['code']}"))
+    lines += [
+        (452, 40, f"发票号码：{invoice['number']}"),
+        (452, 58, f"开票日期：{invoice['date']}"),
+        (20, 90, f"购买方 名称：{invoice['buyer']}"),
+        (20, 110, f"统一社会信用代码/纳税人识别号：{invoice['buyer_tax_id']}"),
+        (20, 140, "项目名称"), (400, 140, "金额"), (480, 140, "税率"), (530, 140, "税额"),
+        (20, 165, invoice["item"]), (400, 165, f"{invoice['amount']:.2f}"),
+        (480, 165, f"{invoice['rate']}%"), (530, 165, f"{invoice['tax']:.2f}"),
+        (20, 280, f"合计 ¥{invoice['amount']:.2f} ¥{invoice['tax']:.2f}"),
+        (20, 300, f"价税合计（小写）¥{invoice['total']:.2f}"),
+        (20, 340, f"销售方 名称：{invoice['seller']}"),
+        (20, 360, f"统一社会信用代码/纳税人识别号：{invoice['seller_tax_id']}"),
+    ]
+    if invoice["remark"]:
+        lines.append((420, 340, f"备注：{invoice['remark']}"))
+    return lines
+
+
+def _draw(page, lines):
+    for x, y, text in lines:
+        page.insert_text((x, y), text, fontname="china-s", fontsize=FONT_SIZE)
+    page.draw_rect(fitz.Rect(10, 70, PAGE_WIDTH - 10, PAGE_HEIGHT - 10), width=0.8)
+    page.draw_line((10, 260), (PAGE_WIDTH - 10, 260), width=0.5)
+    page.draw_line((10, 320), (PAGE_WIDTH - 10, 320), width=0.5)
+
+
+def _scan(page, rng):
+    """把页面栅格化为模拟扫描件：轻微偏移、旋转，加噪声后JPEG压缩"""
+    from PIL import Image
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(SCAN_ZOOM, SCAN_ZOOM), alpha=False)
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    img = img.rotate(rng.uniform(-0.5, 0.5), resample=Image.BICUBIC, fillcolor=(255, 255, 255),
+                     translate=(rng.randint(-4, 4), rng.randint(-4, 4)))
+    noise = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, 8, (img.height, img.width, 1))
+    pixels = np.clip(np.asarray(img, dtype=np.float32) * 0.96 + 6 + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=SCAN_QUALITY)
+    return buf.getvalue()
+
+
+def build_pdf(output_path, corpus=None):
+    """按语料生成PDF，每张发票一页；返回每页的文本行（语料真值）"""
+    corpus = corpus or load_corpus()[0]
+    rng = random.Random(corpus["seed"])
+    truth = []
+    out = fitz.open()
+    for invoice in corpus["invoices"]:
+        lines = invoice_lines(invoice)
+        truth.append([text for _, _, text in lines])
+        page = out.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        if invoice["style"] == "digital":
+            _draw(page, lines)
+            continue
+        with fitz.open() as scratch:
+            draft = scratch.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+            _draw(draft, lines)
+            page.insert_image(page.rect, stream=_scan(draft, rng))
+    out.save(output_path, garbage=3, deflate=True)
+    out.close()
+    return truth
+
+
+def image_key(img_array):
+    img_array = np.ascontiguousarray(img_array)
+    return hashlib.sha1(f"{img_array.shape}".encode('ascii') + memoryview(img_array).cast('B')).hexdigest()
+
+
+class StubOCR:
+    """桩OCR后端：按页面像素查表返回语料真值（rec_texts/rec_scores/rec_boxes），不做推理
+
+    texts 为 {image_key: 文本行列表}；未知图片返回空结果。
+    ms_per_mp 为每百万像素模拟的推理耗时（毫秒），0表示不模拟。
+    实例本身可作为 OCREngine 的 backend（调用时返回自身）
+    """
+
+    model = {"backend": "stub"}
+
+    def __init__(self, texts, ms_per_mp=0.0):
+        self.texts = texts
+        self.ms_per_mp = ms_per_mp
+
+    def __call__(self):
+        return self
+
+    def _predict_one(self, img_array):
+        if self.ms_per_mp:
+            time.sleep(img_array.shape[0] * img_array.shape[1] / 1e6 * self.ms_per_mp / 1000)
+        lines = self.texts.get(image_key(img_array), [])
+        return {"rec_texts": list(lines), "rec_scores": [0.98] * len(lines),
+                "rec_boxes": [[0, 0, 0, 0]] * len(lines)}
+
+    def predict(self, images):
+        if isinstance(images, (list, tuple)):
+            return [self._predict_one(img) for img in images]
+        return [self._predict_one(images)]
+
+
+def stub_backend(pdf_path, truth, zoom, ms_per_mp=0.0):
+    """按 zoom 渲染语料PDF的每页，建立 像素 → 真值文本 的对照表"""
+    from invoice_ocr.render import render_page
+
+    texts = {}
+    with fitz.open(pdf_path) as doc:
+        for page, lines in zip(doc, truth):
+            texts[image_key(render_page(page, zoom))] = lines
+    return StubOCR(texts, ms_per_mp)
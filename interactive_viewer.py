@@ -1,11 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pandas as pd
-from PIL import Image, ImageTk
-import fitz  # PyMuPDF
-import io
+from PIL import ImageTk
+import multiprocessing
 import os
 
+from invoice_ocr.viewer_pages import DRAFT_RESAMPLE, TILE_SIZE, PageImages, PageRenderer, PdfRenderer, TiledPage
+
+# -------------------------- 配置参数 --------------------------
+# 页面渲染方式："direct" 直接从PDF按当前缩放只栅格化可视区域，不生成PNG缓存；
+#              "png" 后台把每页渲染为4倍PNG（<PDF名>_pages_cache 目录）后缩小显示
+RENDER_MODE = "direct"
+RENDER_POLL_MS = 50  # 取回后台渲染结果的间隔（毫秒）
+ZOOM_REFINE_MS = 150  # 滚轮缩放停止多久后生成高质量图块（毫秒）
+REFINE_POLL_MS = 30  # 检查高质量图块是否生成完的间隔（毫秒）
+
 class InvoiceViewerApp:
     def __init__(self, root):
         self.root = root
@@ -16,12 +25,17 @@ class InvoiceViewerApp:
         self.pdf_path = None
         self.excel_path = None
         self.df = None
-        self.png_files = []
+        self.page_count = 0
         self.current_page = 0
         self.image_dir = None
+        self.renderer = None  # 后台页面渲染
+        self.page_images = None  # 已解码页面的缓存（含缩放后的显示图）
+        self.render_job = None
+        self.render_done = None
 
         # 创建UI（先创建界面）
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # 选择PDF文件
         self.select_pdf_file()
@@ -50,24 +64,24 @@ class InvoiceViewerApp:
         # 创建图片缓存目录
         base_name = os.path.splitext(pdf_name)[0]
         self.image_dir = f"{base_name}_pages_cache"
-        if not os.path.exists(self.image_dir):
+        if RENDER_MODE == "png" and not os.path.exists(self.image_dir):
             os.makedirs(self.image_dir)
 
-        # 自动生成PNG图片
+        # 打开PDF（PNG渲染方式下启动后台渲染）
         self.generate_pdf_images()
 
         # 查找对应的Excel文件
         self.find_excel_file(base_name)
 
-        # 加载PNG文件列表
-        self.load_png_files()
+        # 读取页数
+        self.load_pages()
 
         # 更新表格数据
         if self.df is not None:
             self.refresh_table()
 
         # 显示第一页
-        if len(self.png_files) > 0:
+        if self.page_count > 0:
             self.show_page(0)
 
     def find_excel_file(self, base_name):
@@ -103,40 +117,71 @@ class InvoiceViewerApp:
         print("未找到对应的Excel文件")
 
     def generate_pdf_images(self):
-        """生成PDF页面的PNG图片"""
+        """打开PDF准备渲染；PNG渲染方式下启动后台渲染：页面按需在进程池中生成PNG，当前页优先、相邻页预取，其余页面空闲时补齐"""
+        self.stop_renderer()
         print(f"正在处理PDF: {self.pdf_path}")
 
         try:
-            pdf_doc = fitz.open(self.pdf_path)
-            zoom = 4.0  # 高分辨率
-
-            for page_num in range(len(pdf_doc)):
-                image_path = os.path.join(self.image_dir, f"page_{page_num + 1}.png")
-
-                # 检查是否已存在
-                if os.path.exists(image_path):
-                    print(f"  页面 {page_num + 1} PNG已存在，跳过")
-                    continue
-
-                try:
-                    page = pdf_doc[page_num]
-                    mat = fitz.Matrix(zoom, zoom)
-                    pix = page.get_pixmap(matrix=mat)
-                    img_data = pix.tobytes("png")
-
-                    # 直接保存PNG数据
-                    with open(image_path, 'wb') as f:
-                        f.write(img_data)
-
-                    print(f"  [OK] 生成页面 {page_num + 1} PNG图片")
-                except Exception as e:
-                    print(f"  [ERROR] 生成页面 {page_num + 1} 失败: {e}")
-
-            print(f"PDF页面PNG图片生成完成，共 {len(pdf_doc)} 页")
-            pdf_doc.close()
-
+            if RENDER_MODE == "png":
+                self.renderer = PageRenderer(self.pdf_path, self.image_dir)
+            else:
+                self.renderer = PdfRenderer(self.pdf_path)
+            self.page_images = PageImages(self.renderer)
         except Exception as e:
             messagebox.showerror("错误", f"处理PDF失败: {e}")
+            return
+
+        if RENDER_MODE != "png":
+            # 直接渲染：显示时只栅格化可视区域，不需要后台生成页面
+            print(f"PDF共 {self.renderer.page_count} 页，直接从PDF渲染可视区域")
+            self.update_status(f"共 {self.renderer.page_count} 页")
+            return
+
+        print(f"PDF共 {self.renderer.page_count} 页，已有PNG {len(self.renderer.ready)} 页，其余页面后台渲染")
+        self.render_done = None
+        self.poll_renderer()
+
+    def poll_renderer(self):
+        """定时取回后台渲染完成的页面：当前页就绪后替换预览，状态栏显示渲染进度"""
+        renderer = self.renderer
+        for page_num, error in renderer.poll():
+            if error:
+                print(f"  [ERROR] 生成页面 {page_num + 1} 失败: {error}")
+            elif page_num == self.current_page and self.showing_preview:
+                self.show_page(page_num)
+            elif abs(page_num - self.current_page) == 1:
+                self.page_images.prefetch([page_num], self.current_view(), self.visible_tiles())
+
+        total = renderer.page_count
+        if renderer.done != self.render_done:
+            self.render_done = renderer.done
+            if renderer.done < total:
+                self.update_status(f"后台渲染页面 {renderer.done}/{total}")
+            else:
+                self.update_status(f"页面渲染完成，共 {total} 页")
+                print(f"PDF页面PNG图片生成完成，共 {total} 页")
+
+        if renderer.done < total:
+            self.render_job = self.root.after(RENDER_POLL_MS, self.poll_renderer)
+        else:
+            self.render_job = None
+
+    def stop_renderer(self):
+        """停止后台渲染（打开新文件或关闭窗口时）"""
+        if self.render_job is not None:
+            self.root.after_cancel(self.render_job)
+            self.render_job = None
+        if self.renderer is not None:
+            # 先停掉预取/高质量图块任务，再关闭文档（直接渲染方式下任务还在读取PDF页面）
+            self.page_images.close()
+            self.renderer.close()
+            self.renderer = None
+            self.page_images = None
+
+    def on_close(self):
+        """关闭窗口"""
+        self.stop_renderer()
+        self.root.destroy()
 
     def load_data(self):
         """加载Excel数据"""
@@ -149,18 +194,10 @@ class InvoiceViewerApp:
             print(f"加载Excel失败: {e}")
             self.df = pd.DataFrame()
 
-    def load_png_files(self):
-        """加载PNG图片文件列表"""
-        if not self.image_dir or not os.path.exists(self.image_dir):
-            print(f"错误: 图片目录不存在 {self.image_dir}")
-            return
-
-        # 获取所有PNG文件并按文件名排序
-        png_files = [f for f in os.listdir(self.image_dir) if f.endswith('.png')]
-        png_files.sort(key=lambda x: int(x.split('_')[1].split('.')[0]) if '_' in x else 0)
-
-        self.png_files = [os.path.join(self.image_dir, f) for f in png_files]
-        print(f"成功加载 {len(self.png_files)} 个PNG图片文件")
+    def load_pages(self):
+        """读取页数（PNG渲染方式下尚未渲染的页面在显示时按需生成）"""
+        self.page_count = self.renderer.page_count if self.renderer is not None else 0
+        print(f"成功加载 {self.page_count} 个页面")
 
     def refresh_table(self):
         """刷新表格数据"""
@@ -368,11 +405,11 @@ class InvoiceViewerApp:
         self.canvas = tk.Canvas(pdf_container, bg='white')
 
         # 垂直滚动条（右侧）
-        canvas_vsb = ttk.Scrollbar(pdf_container, orient="vertical", command=self.canvas.yview)
+        canvas_vsb = ttk.Scrollbar(pdf_container, orient="vertical", command=self.scroll_y)
         canvas_vsb.pack(side=tk.RIGHT, fill=tk.Y)
 
         # 水平滚动条（底部）
-        canvas_hsb = ttk.Scrollbar(pdf_container, orient="horizontal", command=self.canvas.xview)
+        canvas_hsb = ttk.Scrollbar(pdf_container, orient="horizontal", command=self.scroll_x)
         canvas_hsb.pack(side=tk.BOTTOM, fill=tk.X)
 
         # 配置Canvas滚动条
@@ -483,14 +520,27 @@ class InvoiceViewerApp:
             width=8, height=2, bg='#696969', fg='white', font=("微软雅黑", 9)
         ).pack(side=tk.LEFT, padx=3)
 
+        # ==================== 状态栏 ====================
+        self.status_bar = tk.Label(
+            self.root,
+            text="就绪 | 请选择PDF文件",
+            bd=1,
+            relief=tk.SUNKEN,
+            anchor=tk.W,
+            font=("微软雅黑", 9)
+        )
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+
         # ==================== 初始化参数 ====================
         self.zoom_factor = 2.0  # 默认放大
         self.rotation_angle = 90  # 默认横版
         self.flip_horizontal = False
         self.flip_vertical = False
-        self.pdf_image = None
-        self.pdf_image_tk = None
-        self.base_image = None  # 原始图片（未缩放）
+        self.page = None  # 当前页的图像金字塔（TiledPage）
+        self.tile_items = {}  # Canvas上已显示的图块：(列, 行) → (图形项, PhotoImage, 是否为草图块)
+        self.zoom_generation = 0  # 每次重绘加一，过期的高质量图块任务据此作废
+        self.refine_job = None
+        self.showing_preview = False  # 当前显示的是高分辨率PNG就绪前的预览
 
         # 绑定缩放事件
         self.bind_zoom_events()
@@ -511,14 +561,19 @@ class InvoiceViewerApp:
         # 让Canvas可以接收事件
         self.canvas.bind('<Button-1>', self.on_canvas_click)
 
+        # 窗口大小变化时补上新露出的图块
+        self.canvas.bind('<Configure>', lambda e: self.update_tiles())
+
     def on_canvas_click(self, event):
         """点击Canvas时获取焦点"""
         self.canvas.focus_set()
 
     def on_slider_change(self, value):
-        """滑块拖动缩放"""
+        """滑块拖动缩放（滚轮、按钮缩放后同步滑块位置时也会触发，比例未变则不重绘）"""
+        if int(value) == round(self.zoom_factor * 100):
+            return
         self.zoom_factor = float(value) / 100.0
-        self.refresh_display()
+        self.refresh_display(fast=True)
         self.update_page_label()
 
     def on_mousewheel(self, event):
@@ -533,7 +588,8 @@ class InvoiceViewerApp:
             # 向下滚动 = 缩小
             self.zoom_factor = max(self.zoom_factor - scale_step, 0.5)
 
-        self.refresh_display()
+        # 先显示快速预览，滚轮停下后再替换为高质量图块
+        self.refresh_display(fast=True)
         self.update_page_label()
         self.update_slider()
 
@@ -549,7 +605,7 @@ class InvoiceViewerApp:
         elif event.num == 5:
             self.zoom_factor = max(self.zoom_factor - scale_step, 0.5)
 
-        self.refresh_display()
+        self.refresh_display(fast=True)
         self.update_page_label()
         self.update_slider()
         return 'break'
@@ -568,9 +624,13 @@ class InvoiceViewerApp:
     def update_page_label(self):
         """更新页码标签"""
         self.page_label.config(
-            text=f"第 {self.current_page + 1} / {len(self.png_files)} 页 | {int(self.zoom_factor * 100)}%"
+            text=f"第 {self.current_page + 1} / {self.page_count} 页 | {int(self.zoom_factor * 100)}%"
         )
 
+    def update_status(self, message):
+        """更新状态栏"""
+        self.status_bar.config(text=message)
+
     def on_tree_click(self, event):
         """点击表格时获取焦点，确保滚轮可用"""
         self.tree.focus_set()
@@ -632,57 +692,63 @@ class InvoiceViewerApp:
 
     def show_page(self, page_num):
         """显示PNG图片页面"""
-        if page_num < 0 or page_num >= len(self.png_files):
+        if page_num < 0 or page_num >= self.page_count:
             return
 
+        step = -1 if page_num < self.current_page else 1
         self.current_page = page_num
-        image_path = self.png_files[page_num]
 
-        if not os.path.exists(image_path):
-            print(f"警告: PNG文件不存在 {image_path}")
-            return
+        # 当前页最先渲染，相邻页面预取
+        self.renderer.focus(page_num)
 
         try:
-            # 加载原始PNG图片（保持原始尺寸，不缩放）
-            img = Image.open(image_path)
-            self.base_image = img  # 保存原始图片作为基准
+            if self.renderer.is_ready(page_num):
+                # 原始PNG图片（保持原始尺寸，不缩放），解码结果和图块在缓存中复用
+                self.page = self.page_images.page(page_num)
+                self.showing_preview = False
+            else:
+                # PNG还在后台渲染：先按当前显示倍数直接渲染预览，PNG就绪后自动替换
+                zoom = min(self.zoom_factor, self.renderer.zoom)
+                self.page = TiledPage(self.renderer.preview(page_num, zoom), zoom)
+                self.showing_preview = True
 
             # 根据当前缩放比例显示
             self.display_scaled_image()
 
+            # 后台预先解码、缩放翻页方向的下一页和反方向的上一页
+            self.page_images.prefetch([page_num + step, page_num - step], self.current_view(), self.visible_tiles())
+
         except Exception as e:
             print(f"加载PNG图片失败: {e}")
 
-    def display_scaled_image(self):
-        """根据当前缩放比例显示图片"""
-        if self.base_image is None:
-            return
-
-        try:
-            # 获取基准图片
-            img = self.base_image.copy()
-
-            # 计算原始尺寸（图片是用4倍DPI生成的）
-            base_width = int(img.width / 4.0)
-            base_height = int(img.height / 4.0)
-
-            # 根据zoom_factor缩放
-            new_width = int(base_width * self.zoom_factor)
-            new_height = int(base_height * self.zoom_factor)
+    def current_view(self):
+        """当前显示参数：(缩放比例, 旋转角度, 水平翻转, 垂直翻转)，用作图块的缓存键"""
+        return (round(self.zoom_factor, 2), self.rotation_angle, self.flip_horizontal, self.flip_vertical)
 
-            # 高质量缩放
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    def display_scaled_image(self, fast=False):
+        """根据当前缩放比例显示图片：只生成与可视区域相交的图块，滚动时再补上新露出的图块
 
-            # 应用旋转变换
-            img = self.apply_transform(img)
-
-            # 更新显示
-            self.pdf_image = img
-            self.pdf_image_tk = ImageTk.PhotoImage(img)
+        fast 为真时（滚轮、滑块连续缩放）先用最近邻插值显示草图块，
+        停止缩放 ZOOM_REFINE_MS 毫秒后在后台线程生成高质量图块替换
+        """
+        if self.page is None:
+            return
 
+        try:
+            # 之前的高质量图块任务作废
+            self.zoom_generation += 1
+            if self.refine_job is not None:
+                self.root.after_cancel(self.refine_job)
+                self.refine_job = None
+
+            # 按缩放、旋转后的整页尺寸设置滚动区域
+            width, height = self.page.size(self.current_view())
             self.canvas.delete("all")
-            self.canvas.create_image(0, 0, anchor='nw', image=self.pdf_image_tk)
-            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+            self.tile_items = {}
+            self.canvas.configure(scrollregion=(0, 0, width, height))
+            self.update_tiles(fast)
+            if fast:
+                self.refine_job = self.root.after(ZOOM_REFINE_MS, self.refine_tiles)
 
             # 更新标签和滑块
             self.update_page_label()
@@ -691,17 +757,103 @@ class InvoiceViewerApp:
         except Exception as e:
             print(f"显示图片失败: {e}")
 
-    def apply_transform(self, img):
-        """应用翻转和旋转变换"""
-        if self.rotation_angle != 0:
-            img = img.rotate(self.rotation_angle, expand=True)
+    def visible_tiles(self):
+        """与Canvas可视区域相交的图块"""
+        if self.page is None:
+            return []
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        box = (left, top, left + self.canvas.winfo_width(), top + self.canvas.winfo_height())
+        return self.page.tiles(self.current_view(), box)
+
+    def update_tiles(self, fast=False):
+        """显示进入可视区域的图块，删除移出可视区域的图块"""
+        if self.page is None:
+            return
+
+        view = self.current_view()
+        visible = set(self.visible_tiles())
+        for key in list(self.tile_items):
+            if key not in visible:
+                self.canvas.delete(self.tile_items.pop(key)[0])
+
+        for tx, ty in visible - self.tile_items.keys():
+            self.show_tile(tx, ty, *self.make_tile(view, tx, ty, fast))
+
+    def make_tile(self, view, tx, ty, fast):
+        """生成一个图块，返回 (图片, 是否为草图块)；已缓存的高质量图块直接使用"""
+        if not self.showing_preview:
+            tile = self.page_images.peek(self.current_page, view, tx, ty)
+            if tile is not None:
+                return tile, False
+            if not fast:
+                return self.page_images.tile(self.current_page, view, tx, ty), False
+        if fast:
+            return self.page.tile(view, tx, ty, DRAFT_RESAMPLE), True
+        return self.page.tile(view, tx, ty), False
+
+    def show_tile(self, tx, ty, tile, draft):
+        """在Canvas上显示（或替换）一个图块"""
+        if (tx, ty) in self.tile_items:
+            self.canvas.delete(self.tile_items.pop((tx, ty))[0])
+        photo = ImageTk.PhotoImage(tile)
+        item = self.canvas.create_image(tx * TILE_SIZE, ty * TILE_SIZE, anchor='nw', image=photo)
+        self.tile_items[(tx, ty)] = (item, photo, draft)
+
+    def refine_tiles(self):
+        """缩放停止后在后台线程生成高质量图块，完成后替换草图块；期间再次缩放则作废"""
+        self.refine_job = None
+        drafts = [key for key, (_, _, draft) in self.tile_items.items() if draft]
+        if not drafts:
+            return
+
+        generation, view, page = self.zoom_generation, self.current_view(), self.page
+        index = None if self.showing_preview else self.current_page
+        page_images = self.page_images
+
+        def work():
+            tiles = {}
+            for tx, ty in drafts:
+                if generation != self.zoom_generation:
+                    return None
+                if index is None:
+                    tiles[(tx, ty)] = page.tile(view, tx, ty)
+                else:
+                    tiles[(tx, ty)] = page_images.tile(index, view, tx, ty, wait=False)
+            return tiles
+
+        self.poll_refine(page_images.submit(work), generation)
+
+    def poll_refine(self, future, generation):
+        """等待高质量图块生成完成，替换仍在显示的草图块"""
+        if generation != self.zoom_generation:
+            return
+        if not future.done():
+            self.refine_job = self.root.after(REFINE_POLL_MS, self.poll_refine, future, generation)
+            return
+
+        self.refine_job = None
+        try:
+            tiles = future.result()
+        except Exception as e:
+            print(f"生成高质量图块失败: {e}")
+            return
+        for (tx, ty), tile in (tiles or {}).items():
+            if (tx, ty) in self.tile_items:
+                self.show_tile(tx, ty, tile, False)
+
+        # 等待期间滚动新露出的草图块再处理一轮
+        if any(draft for _, _, draft in self.tile_items.values()):
+            self.refine_job = self.root.after(ZOOM_REFINE_MS, self.refine_tiles)
 
-        if self.flip_horizontal:
-            img = img.transpose(Image.FLIP_LEFT_RIGHT)
-        if self.flip_vertical:
-            img = img.transpose(Image.FLIP_TOP_BOTTOM)
+    def scroll_x(self, *args):
+        """水平滚动条"""
+        self.canvas.xview(*args)
+        self.update_tiles()
 
-        return img
+    def scroll_y(self, *args):
+        """垂直滚动条"""
+        self.canvas.yview(*args)
+        self.update_tiles()
 
     def rotate(self, angle):
         """旋转图片"""
@@ -728,29 +880,29 @@ class InvoiceViewerApp:
         self.update_slider()
         self.update_page_label()
 
-    def refresh_display(self):
+    def refresh_display(self, fast=False):
         """刷新显示 - 根据当前缩放比例重新显示"""
-        self.display_scaled_image()
+        self.display_scaled_image(fast)
 
     def change_page(self, delta):
         """翻页"""
         new_page = self.current_page + delta
-        if 0 <= new_page < len(self.png_files):
+        if 0 <= new_page < self.page_count:
             self.show_page(new_page)
 
     def fit_to_window(self):
         """适应窗口"""
-        if self.base_image is None:
+        if self.page is None:
             return
 
         canvas_width = self.canvas.winfo_width()
         if canvas_width > 1:
-            # 计算原始尺寸（图片是用4倍DPI生成的）
-            base_width = int(self.base_image.width / 4.0)
+            # 页面原始尺寸（缩放比例为1时）
+            base_width, base_height = self.page.scaled_size(1.0)
 
             # 考虑旋转（如果旋转了90度，宽度和高度会交换）
             if self.rotation_angle % 180 != 0:
-                base_width = int(self.base_image.height / 4.0)
+                base_width = base_height
 
             # 计算合适的缩放比例
             scale = (canvas_width * 0.95) / base_width
@@ -1009,7 +1161,8 @@ class InvoiceViewerApp:
 
         file_path = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel文件", "*.xlsx"), ("所有文件", "*.*")],
+            filetypes=[("Excel文件", "*.xlsx"), ("Parquet文件", "*.parquet"), ("Arrow文件", "*.arrow"),
+                       ("所有文件", "*.*")],
             initialfile="345_票据识别结果_已修改.xlsx",
             parent=self.root
         )
@@ -1018,7 +1171,12 @@ class InvoiceViewerApp:
             return
 
         try:
-            self.df.to_excel(file_path, index=False, engine='openpyxl')
+            if file_path.lower().endswith(('.parquet', '.arrow', '.feather')):
+                # 列式格式按票据表结构写出（日期、金额为类型化列），需要 pyarrow
+                from invoice_ocr.columnar import write_invoices
+                write_invoices(self.df.astype(object).where(self.df.notna(), None).to_dict('records'), file_path)
+            else:
+                self.df.to_excel(file_path, index=False, engine='openpyxl')
             messagebox.showinfo("成功", f"数据已保存到:\n{file_path}", parent=self.root)
             self.stats_label.config(text=f"已保存", fg='green')
         except Exception as e:
@@ -1063,6 +1221,7 @@ class InvoiceViewerApp:
             self.tree.insert('', 'end', iid=idx, values=list(row))
 
 def main():
+    multiprocessing.freeze_support()  # 打包为exe后后台渲染进程需要
     root = tk.Tk()
     app = InvoiceViewerApp(root)
     root.mainloop()
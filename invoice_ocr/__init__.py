@@ -0,0 +1,20 @@
+"""
+票据OCR公共库
+功能：供各票据识别脚本共享的OCR引擎、结果缓存、页面渲染、版式区域解析、文本解析、报表导出等组件；
+      InvoiceProcessor 串联 渲染 → OCR → 解析 → 导出，run_batch 批量识别整个目录；
+      命令行入口见 python -m invoice_ocr --help
+"""
+
+from .batch import run_batch
+from .cache import OCRCache
+from .engine import OCREngine
+from .export import write_excel
+from .layout import parse_invoice_regions
+from .parsing import parse_result
+from .processor import InvoiceProcessor
+from .render import pixmap_to_array, render_page
+
+__all__ = [
+    "InvoiceProcessor", "OCRCache", "OCREngine", "parse_invoice_regions", "parse_result",
+    "pixmap_to_array", "render_page", "run_batch", "write_excel",
+]
@@ -0,0 +1,92 @@
+"""
+自适应分辨率识别
+功能：先以低分辨率识别整页，只对置信度低的文本区域（或整页）以高分辨率重新渲染识别，
+      大部分清晰页面无需承担高倍渲染的像素量，小字号区域仍能得到足够的分辨率；
+      按版式模板识别时以模板区域为单位复核
+"""
+
+import fitz  # PyMuPDF
+
+from .render import render_page
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_LOW_ZOOM = 1.5
+SCORE_THRESHOLD = 0.8      # 低于此置信度的文本行需要高分辨率复核
+MAX_REGION_RETRIES = 8     # 低置信度区域超过此数量时直接整页重渲染
+REGION_PADDING = 3         # 区域裁剪时向外扩展的边距（PDF坐标，单位pt）
+
+
+def _scale_boxes(boxes, factor):
+    """按比例换算边界框坐标"""
+    return [[int(round(v * factor)) for v in box] for box in boxes]
+
+
+def _merge_region(result, idx, region):
+    """用高分辨率区域的识别结果替换原文本行（仅当置信度更高时）"""
+    texts = [t for t in region["rec_texts"] if t]
+    if not texts:
+        return False
+
+    score = sum(region["rec_scores"]) / len(region["rec_scores"])
+    if score <= result["rec_scores"][idx]:
+        return False
+
+    result["rec_texts"][idx] = "".join(texts)
+    result["rec_scores"][idx] = score
+    return True
+
+
+def ocr_page_adaptive(page, predict, predict_batch, low_img, low_zoom, high_zoom,
+                      threshold=SCORE_THRESHOLD):
+    """自适应识别一页
+
+    low_img 为已按 low_zoom 渲染好的页面图片；predict/predict_batch 分别识别单张/多张图片。
+    返回结果的 rec_boxes 统一换算到 high_zoom 下的像素坐标，refined 字段记录复核情况
+    """
+    result = predict(low_img)
+    low_idx = [i for i, score in enumerate(result["rec_scores"]) if score < threshold]
+
+    # 低分辨率下什么都没识别到，或低置信度区域太多：整页高分辨率重识别
+    if not result["rec_texts"] or len(low_idx) > MAX_REGION_RETRIES:
+        result = predict(render_page(page, high_zoom))
+        result["refined"] = {"regions": 0, "full_page": True}
+        return result
+
+    result["rec_boxes"] = _scale_boxes(result["rec_boxes"], high_zoom / low_zoom)
+    result["refined"] = {"regions": 0, "full_page": False}
+    if not low_idx:
+        return result
+
+    # 只把低置信度文本行所在区域以高分辨率重新渲染，批量识别
+    crops = []
+    for i in low_idx:
+        x0, y0, x1, y1 = result["rec_boxes"][i][:4]
+        clip = fitz.Rect(x0 / high_zoom - REGION_PADDING, y0 / high_zoom - REGION_PADDING,
+                         x1 / high_zoom + REGION_PADDING, y1 / high_zoom + REGION_PADDING)
+        crops.append(render_page(page, high_zoom, clip=clip & page.rect))
+
+    for i, region in zip(low_idx, predict_batch(crops)):
+        if _merge_region(result, i, region):
+            result["refined"]["regions"] += 1
+
+    return result
+
+
+def ocr_regions_adaptive(page, predict_batch, rects, low_crops, low_zoom, high_zoom,
+                         threshold=SCORE_THRESHOLD):
+    """自适应识别版式模板的各区域
+
+    low_crops 为各区域按 low_zoom 渲染好的图片（与 rects 顺序一致），先批量识别；
+    没有识别出文字或含低置信度文本行的区域再以 high_zoom 重新渲染，批量识别后整体替换。
+    返回 区域名 → 识别结果，rec_boxes 统一换算到 high_zoom 下的区域内像素坐标
+    """
+    regions = dict(zip(rects, predict_batch(low_crops)))
+    retry = [name for name, region in regions.items()
+             if not region["rec_texts"] or min(region["rec_scores"]) < threshold]
+
+    for region in regions.values():
+        region["rec_boxes"] = _scale_boxes(region["rec_boxes"], high_zoom / low_zoom)
+    if retry:
+        crops = [render_page(page, high_zoom, clip=rects[name]) for name in retry]
+        regions.update(zip(retry, predict_batch(crops)))
+    return regions
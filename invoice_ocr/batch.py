@@ -0,0 +1,237 @@
+"""
+批量识别
+功能：遍历目录树中的PDF和图片，所有文件共用一个OCR进程池（每个工作进程只加载一次模型），
+      各文件的页面连续提交，文件之间进程池不空转；每完成一个文件就把解析结果写入检查点，
+      中断后重新运行会跳过已完成的文件；全部完成后输出一份汇总报表；
+      处理器启用发票库时，已入库的重复发票不进入检查点和汇总
+"""
+
+import json
+import os
+
+from .engine import SOURCE_DUPLICATE
+from .export import ExcelWriter
+from .image_batches import IMAGE_EXTENSIONS
+from .parsing import parse_result
+from .pipeline import run_pipeline
+from .processor import SOURCE_FILE_KEY
+
+# -------------------------- 配置参数 --------------------------
+PDF_EXTENSIONS = ('.pdf',)
+SOURCE_PAGE_KEY = "页码"  # 每行记录在来源文件中的页码
+
+
+def find_inputs(root):
+    """递归列出目录下的PDF和图片文件，返回按字母排序的相对路径"""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(PDF_EXTENSIONS + IMAGE_EXTENSIONS):
+                found.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(found)
+
+
+def file_stamp(path):
+    """文件大小和修改时间，用于判断检查点中的记录是否仍然有效"""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class BatchCheckpoint:
+    """批量任务检查点
+
+    JSON Lines 文件，每行记录一个已完成文件的相对路径、大小/修改时间和解析结果；
+    每条记录写入后立即落盘，进程崩溃最多丢失正在处理的文件。文件内容变化后旧记录自动失效
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}  # 相对路径 → 记录
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def load(self):
+        """读取已有检查点；崩溃时写了一半的最后一行忽略"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.done[record["path"]] = record
+
+    def reset(self):
+        """清空检查点，所有文件重新识别"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.done = {}
+
+    def is_done(self, rel_path, stamp):
+        record = self.done.get(rel_path)
+        return record is not None and record["stamp"] == stamp
+
+    def rows(self, rel_path):
+        return self.done[rel_path]["rows"]
+
+    def record(self, rel_path, stamp, rows):
+        """记录一个已完成的文件"""
+        if self._file is None:
+            # 上次崩溃留下的半行之后另起一行，避免与新记录粘连
+            needs_newline = False
+            if os.path.exists(self.path) and os.path.getsize(self.path):
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if needs_newline:
+                self._file.write("\n")
+
+        record = {"path": rel_path, "stamp": stamp, "rows": rows}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done[rel_path] = record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _iter_tasks(engine, root, pending, empty):
+    """把待处理文件展开为逐页任务：(完整路径, 页序号, 总页数, 相对路径, 文件戳)
+
+    没有页面的PDF不产生任务，(相对路径, 文件戳) 追加到 empty，由调用方记为已完成
+    """
+    for rel_path, stamp in pending:
+        path = os.path.join(root, rel_path)
+        if not rel_path.lower().endswith(PDF_EXTENSIONS):
+            yield path, None, 1, rel_path, stamp
+            continue
+
+        try:
+            page_count = engine.page_count(path)
+        except Exception as e:
+            print(f"  [ERROR] 无法打开 {rel_path}: {e}")
+            continue
+        if page_count == 0:
+            print(f"  [WARNING] {rel_path} 没有页面，已跳过")
+            empty.append((rel_path, stamp))
+        for page_index in range(page_count):
+            yield path, page_index, page_count, rel_path, stamp
+
+
+def run_batch(processor, root, output_path, checkpoint_path, restart=False, title=None,
+              columnar_dir=None, columnar_format="parquet"):
+    """批量识别 root 下的所有PDF和图片，汇总写入 output_path；返回 (汇总行数, 出错文件列表)
+
+    columnar_dir 不为None时，新识别文件的解析结果和OCR文本行追加到该列式数据集；
+    文件先写入数据集的当前分片，分片提交后才记入检查点，中断时两者一起回退，重新运行不会漏写或重复
+    """
+    if columnar_dir:
+        from .columnar import ColumnarDataset  # 可选依赖 pyarrow
+        dataset = ColumnarDataset(columnar_dir, columnar_format)
+    else:
+        dataset = None
+    try:
+        return _run_batch(processor, root, output_path, checkpoint_path, restart, title, dataset)
+    except BaseException:
+        if dataset is not None:
+            dataset.abort()
+        raise
+
+
+def _run_batch(processor, root, output_path, checkpoint_path, restart, title, dataset):
+    inputs = find_inputs(root)
+    stamps = {rel_path: file_stamp(os.path.join(root, rel_path)) for rel_path in inputs}
+
+    with BatchCheckpoint(checkpoint_path) as checkpoint:
+        if restart:
+            checkpoint.reset()
+        else:
+            checkpoint.load()
+
+        pending = [(rel_path, stamps[rel_path]) for rel_path in inputs
+                   if not checkpoint.is_done(rel_path, stamps[rel_path])]
+        print(f"共 {len(inputs)} 个文件，已完成 {len(inputs) - len(pending)} 个，待处理 {len(pending)} 个")
+
+        def parse(item):
+            (_, page_index, page_count, rel_path, stamp), result = item
+            if result["source"] == SOURCE_DUPLICATE:
+                return rel_path, stamp, page_count, None, result
+            row = parse_result(result, page_index or 0, processor.parser)
+            row[SOURCE_FILE_KEY] = rel_path
+            row[SOURCE_PAGE_KEY] = (page_index or 0) + 1
+            return rel_path, stamp, page_count, row, result
+
+        empty = []  # 没有页面的PDF
+        tasks = _iter_tasks(processor.engine, root, pending, empty)
+        pages = processor.engine.iter_pages(tasks, template=processor.template)
+
+        held = []  # 已写入列式数据集当前分片、等分片提交后再记入检查点的文件
+
+        def commit_held():
+            if dataset is not None:
+                dataset.commit()
+            for record in held:
+                checkpoint.record(*record)
+            held.clear()
+
+        current, current_rows, current_results, current_errors = None, [], [], []
+        failed, finished = [], 0
+        for rel_path, stamp, page_count, row, result in run_pipeline(pages, ("parse", parse)):
+            if rel_path != current:
+                current, current_rows, current_results, current_errors = rel_path, [], [], []
+            current_rows.append(row)
+            current_results.append(result)
+            if result.get("error"):
+                current_errors.append(result["error"])
+            if len(current_rows) < page_count:
+                continue
+
+            # 一个文件的所有页面都已完成：有页面出错时不记入检查点，下次运行重试
+            finished += 1
+            if current_errors:
+                failed.append(rel_path)
+                print(f"  [ERROR] [{finished}/{len(pending)}] {rel_path}: {current_errors[0]}")
+                continue
+            print(f"  [{finished}/{len(pending)}] {rel_path}: {page_count} 页")
+            # 写入发票库，去掉重复发票（OCR前已判定的，以及解析后才发现号码已入库的）
+            path = os.path.join(root, rel_path)
+            kept = [(page_row, page_result) for page_index, (page_row, page_result)
+                    in enumerate(zip(current_rows, current_results))
+                    if not processor.is_duplicate(page_row, path, page_index, page_result)]
+            held.append((rel_path, stamp, [page_row for page_row, _ in kept]))
+            if dataset is not None:
+                for page_row, page_result in kept:
+                    dataset.add_page(page_row, page_result, rel_path, page_row[SOURCE_PAGE_KEY])
+                if not dataset.should_commit():
+                    continue
+            commit_held()
+        commit_held()
+        # 空文档记为已完成（0页），重新运行不再当作失败
+        for rel_path, stamp in empty:
+            checkpoint.record(rel_path, stamp, [])
+
+        print(f"  {processor.engine.report()}")
+
+        # 汇总：按文件路径顺序逐行写出所有已完成文件的结果，票据序号连续编号
+        done = [rel_path for rel_path in inputs if checkpoint.is_done(rel_path, stamps[rel_path])]
+        total = sum(len(checkpoint.rows(rel_path)) for rel_path in done)
+        with ExcelWriter(output_path, layout=processor.parser, title=title,
+                         extra_headers=(SOURCE_FILE_KEY, SOURCE_PAGE_KEY), total=total) as report:
+            for rel_path in done:
+                for row in checkpoint.rows(rel_path):
+                    report.append(dict(row, 票据序号=report.row_count + 1))
+
+    failed += [rel_path for rel_path, stamp in pending
+               if rel_path not in failed and not checkpoint.is_done(rel_path, stamp)]
+    return report.row_count, failed
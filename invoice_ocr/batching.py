@@ -0,0 +1,175 @@
+"""
+请求微批合并
+功能：把多个调用方并发提交的单个元素合并成批，凑满批大小或等待超时后一次处理，
+      再把各元素的结果分发回各自的调用方；统计批大小、排队等待、处理耗时和吞吐，
+      用于调整等待窗口
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT = 0.01  # 批中第一个元素最多等待的秒数
+METRICS_WINDOW = 2000  # 计算分位数时保留的最近样本数
+
+_STOP = object()
+
+
+def _percentile(sorted_values, pct):
+    """最近秩分位数；无样本时返回0"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class BatchMetrics:
+    """微批统计（线程安全）
+
+    - 排队等待：元素提交到所在批开始处理的时间，主要由等待窗口决定
+    - 延迟：元素提交到结果返回的总时间
+    - 吞吐：元素数 / 批处理耗时之和（调度线程忙碌时的处理速度），
+      以及元素数 / 首末批之间的墙钟时间（实际达到的速度）
+    """
+
+    def __init__(self, max_batch_size, window=METRICS_WINDOW):
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self._first_start = None
+        self._last_end = None
+        self._sizes = deque(maxlen=window)
+        self._waits = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, submitted, started, finished, failed=False):
+        """记录一批：submitted 为批中各元素的提交时刻"""
+        with self._lock:
+            self.batches += 1
+            self.items += len(submitted)
+            self.errors += len(submitted) if failed else 0
+            self.busy_time += finished - started
+            if self._first_start is None:
+                self._first_start = started
+            self._last_end = finished
+            self._sizes.append(len(submitted))
+            self._waits.extend(started - t for t in submitted)
+            self._latencies.extend(finished - t for t in submitted)
+
+    def snapshot(self):
+        """当前统计（时间单位为毫秒，吞吐单位为元素/秒）"""
+        with self._lock:
+            sizes = list(self._sizes)
+            waits = sorted(self._waits)
+            latencies = sorted(self._latencies)
+            wall = (self._last_end - self._first_start) if self.batches else 0.0
+            mean_size = sum(sizes) / len(sizes) if sizes else 0.0
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "errors": self.errors,
+                "mean_batch_size": round(mean_size, 2),
+                "batch_fill": round(mean_size / self.max_batch_size, 3),
+                "wait_ms_p50": round(_percentile(waits, 50) * 1000, 2),
+                "wait_ms_p95": round(_percentile(waits, 95) * 1000, 2),
+                "latency_ms_p50": round(_percentile(latencies, 50) * 1000, 2),
+                "latency_ms_p95": round(_percentile(latencies, 95) * 1000, 2),
+                "busy_items_per_sec": round(self.items / self.busy_time, 1) if self.busy_time else 0.0,
+                "wall_items_per_sec": round(self.items / wall, 1) if wall else 0.0,
+            }
+
+    def summary(self):
+        """一行文字摘要"""
+        m = self.snapshot()
+        return (f"{m['batches']} 批 / {m['items']} 个，平均批大小 {m['mean_batch_size']}"
+                f"（填充率 {m['batch_fill']:.0%}），排队 p50/p95 {m['wait_ms_p50']}/{m['wait_ms_p95']}ms，"
+                f"延迟 p50/p95 {m['latency_ms_p50']}/{m['latency_ms_p95']}ms，"
+                f"吞吐 {m['wall_items_per_sec']}/s（处理中 {m['busy_items_per_sec']}/s）")
+
+
+class MicroBatcher:
+    """微批调度器
+
+    process_batch 接收元素列表，返回等长的结果列表，只在调度线程中调用（无需线程安全）
+    """
+
+    def __init__(self, process_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT,
+                 name="micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.metrics = BatchMetrics(self.max_batch_size)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def submit(self, item):
+        """提交一个元素，返回 Future"""
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def map(self, items):
+        """提交多个元素并等待全部结果（这些元素可能与其他调用方的元素合并在同一批中）"""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """处理完已提交的元素后停止调度线程"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _collect(self, first):
+        """从第一个元素开始凑批：达到批大小或等待超时即返回；返回 (批, 是否收到停止信号)"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _process(self, batch):
+        items = [item for item, _, _ in batch]
+        submitted = [t for _, _, t in batch]
+        started = time.monotonic()
+        try:
+            results = self.process_batch(items)
+        except Exception as e:
+            self.metrics.record(submitted, started, time.monotonic(), failed=True)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        self.metrics.record(submitted, started, time.monotonic())
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch, stopping = self._collect(entry)
+            self._process(batch)
@@ -0,0 +1,138 @@
+"""
+OCR结果磁盘缓存
+功能：以页面像素哈希 + 模型/渲染参数为键持久化 rec_texts/rec_scores/rec_boxes，
+      总大小超过上限时按最近最少使用（LRU）淘汰，未变化的页面无需重新推理
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_CACHE_DIR = ".ocr_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+# 淘汰时清理到上限的比例，避免每次写入都触发淘汰
+EVICT_TARGET_RATIO = 0.9
+
+
+class OCRCache:
+    """内容寻址的OCR结果缓存（多进程共享同一目录）"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._approx_bytes = None  # 当前进程估算的缓存总大小
+
+    @staticmethod
+    def make_key(images, settings):
+        """计算缓存键：像素内容 + 图像形状 + 模型与渲染参数
+
+        images 可以是单张图片，也可以是多张图片（如同一页的多个区域）组成的列表
+        """
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+
+        h = hashlib.sha256()
+        h.update(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        for img_array in images:
+            img_array = np.ascontiguousarray(img_array)
+            h.update(f"{img_array.shape}|{img_array.dtype}".encode('ascii'))
+            h.update(memoryview(img_array).cast('B'))
+        return h.hexdigest()
+
+    def _path(self, key):
+        """按键的前两位分目录存放，避免单目录文件过多"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """读取缓存，未命中返回None；命中时刷新访问时间"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(path)  # 以修改时间记录最近访问，用于LRU淘汰
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, result):
+        """写入缓存（先写临时文件再原子替换，多进程并发写安全）"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        if self._approx_bytes is None:
+            self._approx_bytes = self.total_bytes()
+        else:
+            self._approx_bytes += len(data)
+
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """列出所有缓存文件：(修改时间, 大小, 路径)"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(sub_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def total_bytes(self):
+        """统计缓存总大小"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """按LRU淘汰最久未访问的条目，直到总大小低于目标值"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TARGET_RATIO
+
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+        self._approx_bytes = total
+
+    def clear(self):
+        """清空缓存"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._approx_bytes = 0
@@ -0,0 +1,179 @@
+"""
+命令行入口
+用法:
+  python -m invoice_ocr run a.pdf b.pdf -o 票据识别结果.xlsx [--parser enhanced] [--workers 4]
+  python -m invoice_ocr batch 批量发票/ -o 月结汇总.xlsx [--restart]
+  python -m invoice_ocr serve [--port 8868]      常驻OCR服务，run/batch 加 --server 后不再各自加载模型
+  python -m invoice_ocr query 结果数据集/ --date-from 2025-01-01 --seller 9131...   查询 --columnar 导出的数据集
+"""
+
+import argparse
+import os
+import sys
+
+from .batch import run_batch
+from .batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT
+from .columnar import require_pyarrow
+from .engine import DEFAULT_WORKERS
+from .layout import TEMPLATES
+from .parsing import DEFAULT_PARSER, PARSERS
+from .cache import DEFAULT_CACHE_DIR
+from .journal import DEFAULT_JOURNAL_DIR
+from .processor import InvoiceProcessor
+from .page_hash import DEFAULT_PAGE_HASH_PATH
+from .store import DEFAULT_STORE_PATH
+from .line_recognition import DEFAULT_MAX_LINES
+from .service import DEFAULT_HOST, DEFAULT_PORT, serve
+
+DEFAULT_OUTPUT = "票据识别结果.xlsx"
+
+
+def _common_options():
+    """run 和 batch 共用的识别与导出选项"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"输出Excel路径（默认 {DEFAULT_OUTPUT}）")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default=DEFAULT_PARSER, help="解析规则及报表版式")
+    parser.add_argument("--workers", type=int, default=None, help=f"OCR工作进程数（默认 {DEFAULT_WORKERS}）")
+    parser.add_argument("--zoom", type=float, default=None, help="渲染缩放比例（默认按解析规则）")
+    parser.add_argument("--adaptive-zoom", type=float, default=None,
+                        help="自适应渲染：先按该比例识别，低置信度区域再按 --zoom 复核")
+    parser.add_argument("--template", choices=sorted(TEMPLATES), default=None, help="版式模板，只识别所需区域")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"OCR结果缓存目录（默认 {DEFAULT_CACHE_DIR}）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用OCR结果缓存")
+    parser.add_argument("--no-text-layer", action="store_true", help="不读取PDF文本层，所有页面都OCR")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH,
+                        help=f"发票库路径，已入库的发票（发票代码+号码）在OCR前跳过（默认 {DEFAULT_STORE_PATH}）")
+    parser.add_argument("--no-store", action="store_true", help="不写入发票库，也不跳过重复发票")
+    parser.add_argument("--page-hashes", default=DEFAULT_PAGE_HASH_PATH,
+                        help=f"相似页面索引路径，重新扫描的同一页复用此前的识别结果（默认 {DEFAULT_PAGE_HASH_PATH}）")
+    parser.add_argument("--no-page-hashes", action="store_true", help="不查找相似页面，每页都重新识别")
+    parser.add_argument("--server", default=None,
+                        help=f"常驻OCR服务地址，如 http://{DEFAULT_HOST}:{DEFAULT_PORT}（默认在本地加载模型）")
+    parser.add_argument("--columnar", default=None, metavar="DIR",
+                        help="同时把解析结果和OCR文本行追加到该列式数据集目录（需要 pyarrow）")
+    parser.add_argument("--columnar-format", choices=("parquet", "arrow"), default="parquet",
+                        help="列式数据集格式：Parquet 或 Arrow IPC（默认 parquet）")
+    parser.add_argument("--title", default=None, help="报表标题（默认按报表版式）")
+    parser.add_argument("--open", action="store_true", help="生成后自动打开Excel（仅Windows）")
+    return parser
+
+
+def build_arg_parser():
+    common = _common_options()
+    parser = argparse.ArgumentParser(prog="python -m invoice_ocr", description="识别PDF/图片票据并汇总为一份Excel报表")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", parents=[common], help="识别指定的PDF文件")
+    run.add_argument("inputs", nargs="+", help="PDF文件路径，可以有多个")
+    run.add_argument("--debug-text", default=None, help="把每页原始OCR文本写入该文件")
+    run.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR,
+                     help=f"逐页任务日志目录，中断后重新运行从断点继续（默认 {DEFAULT_JOURNAL_DIR}）")
+    run.add_argument("--no-journal", action="store_true", help="不记录任务日志")
+
+    batch = commands.add_parser("batch", parents=[common], help="递归识别目录下的所有PDF和图片，支持中断续跑")
+    batch.add_argument("root", help="票据所在目录")
+    batch.add_argument("--checkpoint", default=None, help="检查点文件（默认与输出文件同名的 .checkpoint.jsonl）")
+    batch.add_argument("--restart", action="store_true", help="忽略已有检查点，全部重新识别")
+
+    service = commands.add_parser("serve", help="启动常驻OCR服务：只加载一次模型，合并并发请求批量推理")
+    service.add_argument("--host", default=DEFAULT_HOST)
+    service.add_argument("--port", type=int, default=DEFAULT_PORT)
+    service.add_argument("--lang", default="ch")
+    service.add_argument("--threads", type=int, default=None, help="推理线程数（默认CPU核心数）")
+    service.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="每批最多图片数")
+    service.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help="凑批时第一张图片最多等待的毫秒数")
+    service.add_argument("--line-batch", action="store_true",
+                         help="检测与识别分开：各页面的文本行跨页合并成批识别（--max-batch 为每批检测页数）")
+    service.add_argument("--max-lines", type=int, default=DEFAULT_MAX_LINES, help="--line-batch 时每批最多文本行数")
+
+    query = commands.add_parser("query", help="按开票日期/销售方统一信用代码查询列式数据集")
+    query.add_argument("dataset", help="--columnar 导出的数据集目录")
+    query.add_argument("--date-from", default=None, help="开票日期下限（含），如 2025-01-01")
+    query.add_argument("--date-to", default=None, help="开票日期上限（含）")
+    query.add_argument("--seller", default=None, help="销售方统一信用代码")
+    query.add_argument("--format", choices=("parquet", "arrow"), default="parquet", help="数据集格式")
+    query.add_argument("--limit", type=int, default=20, help="最多显示的行数")
+    return parser
+
+
+def _make_processor(args, **kwargs):
+    return InvoiceProcessor(parser=args.parser, workers=args.workers, zoom=args.zoom,
+                            cache_dir=None if args.no_cache else args.cache_dir,
+                            use_text_layer=not args.no_text_layer, adaptive_zoom=args.adaptive_zoom,
+                            template=args.template, server=args.server,
+                            store_path=None if args.no_store else args.store,
+                            page_hash_path=None if args.no_page_hashes else args.page_hashes, **kwargs)
+
+
+def _run(args):
+    missing = [path for path in args.inputs if not os.path.isfile(path)]
+    if missing:
+        for path in missing:
+            print(f"[ERROR] 文件不存在: {path}")
+        return 1
+
+    with _make_processor(args, debug_path=args.debug_text,
+                         journal_dir=None if args.no_journal else args.journal_dir,
+                         columnar_dir=args.columnar, columnar_format=args.columnar_format) as processor:
+        row_count = processor.process_to_excel(args.inputs, args.output, title=args.title,
+                                               with_source=len(args.inputs) > 1)
+
+    print(f"共处理 {len(args.inputs)} 个文件，{row_count} 页")
+    return 0
+
+
+def _batch(args):
+    if not os.path.isdir(args.root):
+        print(f"[ERROR] 目录不存在: {args.root}")
+        return 1
+
+    checkpoint = args.checkpoint or os.path.splitext(args.output)[0] + ".checkpoint.jsonl"
+    with _make_processor(args) as processor:
+        row_count, failed = run_batch(processor, args.root, args.output, checkpoint,
+                                      restart=args.restart, title=args.title,
+                                      columnar_dir=args.columnar, columnar_format=args.columnar_format)
+
+    print(f"共汇总 {row_count} 页，检查点: {checkpoint}")
+    if failed:
+        print(f"[WARNING] {len(failed)} 个文件未完成，重新运行同一命令将只重试这些文件:")
+        for rel_path in failed:
+            print(f"  {rel_path}")
+        return 1
+    return 0
+
+
+def _query(args):
+    from .columnar import read_invoices
+
+    table = read_invoices(args.dataset, args.date_from, args.date_to, args.seller, fmt=args.format)
+    print(f"共 {table.num_rows} 条记录")
+    columns = ["开票日期", "发票号码", "销售方名称", "销售方统一信用代码", "价税合计", "来源文件", "页码"]
+    for row in table.select(columns).slice(0, args.limit).to_pylist():
+        print("  " + " | ".join("" if row[name] is None else str(row[name]) for name in columns))
+    return 0
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "query" or getattr(args, "columnar", None):
+        try:
+            require_pyarrow()
+        except ImportError as e:
+            print(f"[ERROR] {e}")
+            return 1
+    if args.command == "query":
+        return _query(args)
+    if args.command == "serve":
+        serve(args.host, args.port, args.lang, args.threads, args.max_batch, args.max_wait_ms / 1000,
+              args.line_batch, args.max_lines)
+        return 0
+
+    status = _run(args) if args.command == "run" else _batch(args)
+    if status == 0 and args.open:
+        os.startfile(args.output)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
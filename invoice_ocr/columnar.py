@@ -0,0 +1,284 @@
+"""
+列式结果导出（Parquet / Arrow IPC）
+功能：把票据解析结果和OCR原始文本行写成带类型的列式数据集，供下游对账直接读取；
+      数据集是一个目录，每次运行追加新的分片文件，按批写出行组，
+      读取时按 开票日期 / 销售方统一信用代码 过滤（利用行组统计信息跳过无关数据）
+
+目录结构：
+  <数据集>/invoices/part-*.parquet   票据表：票据序号 … 价税合计 + 来源文件/页码
+  <数据集>/lines/part-*.parquet      OCR文本行表：来源文件、页码、行号、文本、置信度、文本框
+
+分片先写入以 . 开头的临时文件，commit 时改名生效；中途中断的分片不会被读到。
+依赖 pyarrow（可选依赖，只有启用列式导出时才需要安装）
+"""
+
+import os
+import time
+import uuid
+
+from .batch import SOURCE_PAGE_KEY
+from .extraction import to_date
+from .processor import SOURCE_FILE_KEY
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_FORMAT = "parquet"  # parquet / arrow（Arrow IPC 文件）
+DEFAULT_ROW_GROUP_SIZE = 2048  # 每攒够多少行写出一个行组（一批）
+PART_ROWS = 100_000  # 单个分片文件的最大票据行数，超过后提交当前分片、开始新分片
+INVOICE_TABLE = "invoices"
+LINE_TABLE = "lines"
+
+# 票据表的列：(列名, 类型)；类型为 int / float / date / str
+INVOICE_COLUMNS = [
+    ("票据序号", "int"), ("票据类型", "str"), ("发票代码", "str"), ("发票号码", "str"), ("开票日期", "date"),
+    ("购买方名称", "str"), ("购买方统一信用代码", "str"), ("销售方名称", "str"), ("销售方统一信用代码", "str"),
+    ("项目名称", "str"), ("金额（不含税）", "float"), ("税率(%)", "float"), ("税额", "float"), ("价税合计", "float"),
+    ("备注", "str"), (SOURCE_FILE_KEY, "str"), (SOURCE_PAGE_KEY, "int"),
+]
+LINE_COLUMNS = [
+    (SOURCE_FILE_KEY, "str"), (SOURCE_PAGE_KEY, "int"), ("行号", "int"), ("文本", "str"), ("置信度", "float32"),
+    ("x0", "int"), ("y0", "int"), ("x1", "int"), ("y1", "int"),
+]
+
+
+def require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("列式导出需要安装 pyarrow：pip install pyarrow") from None
+
+
+def _schema(columns):
+    import pyarrow as pa
+
+    types = {"int": pa.int32(), "float": pa.float64(), "float32": pa.float32(), "date": pa.date32(), "str": pa.string()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _to_float(value):
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    value = _to_float(value)
+    return None if value is None else int(value)
+
+
+_CONVERTERS = {"int": _to_int, "float": _to_float, "float32": _to_float, "date": to_date,
+               "str": lambda value: None if value is None else str(value)}
+
+
+def invoice_record(row, source=None, page=None):
+    """把一行解析结果（字典）转换为票据表的类型化记录；解析规则中没有的列为空"""
+    row = dict(row)
+    if source is not None:
+        row.setdefault(SOURCE_FILE_KEY, source)
+    if page is not None:
+        row.setdefault(SOURCE_PAGE_KEY, page)
+    return {name: _CONVERTERS[kind](row.get(name)) for name, kind in INVOICE_COLUMNS}
+
+
+def line_records(result, source, page):
+    """把一页OCR结果展开为文本行记录"""
+    boxes = result.get("rec_boxes") or []
+    records = []
+    for i, (text, score) in enumerate(zip(result["rec_texts"], result["rec_scores"])):
+        box = list(boxes[i]) if i < len(boxes) and len(boxes[i]) == 4 else [None] * 4
+        records.append({SOURCE_FILE_KEY: source, SOURCE_PAGE_KEY: page, "行号": i + 1, "文本": text,
+                        "置信度": float(score), "x0": _to_int(box[0]), "y0": _to_int(box[1]),
+                        "x1": _to_int(box[2]), "y1": _to_int(box[3])})
+    return records
+
+
+class ColumnarWriter:
+    """单个表的分片写入器：攒够 row_group_size 行写出一个行组，commit 时分片生效
+
+    path 不为None时只写这一个文件（不分片）
+    """
+
+    def __init__(self, table_dir, columns, fmt=DEFAULT_FORMAT, row_group_size=DEFAULT_ROW_GROUP_SIZE, path=None):
+        require_pyarrow()
+        if fmt not in ("parquet", "arrow"):
+            raise ValueError(f"未知的列式格式: {fmt}，可选: parquet, arrow")
+        self.table_dir = table_dir
+        self.schema = _schema(columns)
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.path = path
+        self.part_rows = 0  # 当前分片已写入的行数
+        self._buffer = []
+        self._writer = None
+        self._tmp_path = None
+        self._path = None
+        self._part_seq = 0
+
+    def append(self, record):
+        self._buffer.append(record)
+        self.part_rows += 1
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def _open(self):
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+
+        os.makedirs(self.table_dir, exist_ok=True)
+        self._part_seq += 1
+        if self.path is None:
+            name = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}-{self._part_seq:04d}.{self.fmt}"
+        else:
+            name = os.path.basename(self.path)
+        self._path = os.path.join(self.table_dir, name)
+        self._tmp_path = os.path.join(self.table_dir, "." + name)
+        if self.fmt == "parquet":
+            # 字典编码 + 行组统计信息（min/max），读取时按条件跳过行组
+            self._writer = pq.ParquetWriter(self._tmp_path, self.schema, compression="zstd", write_statistics=True)
+        else:
+            self._writer = ipc.new_file(self._tmp_path, self.schema)
+
+    def flush(self):
+        """把缓冲的行写出为一个行组（Arrow IPC 为一个记录批）"""
+        if not self._buffer:
+            return
+        import pyarrow as pa
+
+        if self._writer is None:
+            self._open()
+        batch = pa.RecordBatch.from_pylist(self._buffer, schema=self.schema)
+        if self.fmt == "parquet":
+            self._writer.write_batch(batch, row_group_size=len(self._buffer))
+        else:
+            self._writer.write_batch(batch)
+        self._buffer = []
+
+    def commit(self):
+        """写完当前分片并改名生效；之后再写入的行进入新分片"""
+        self.flush()
+        if self._writer is None:
+            if self.path is None:
+                return
+            self._open()  # 单文件模式下没有数据也写出只含表结构的空文件
+        self._writer.close()
+        os.replace(self._tmp_path, self._path)
+        self._writer = None
+        self.part_rows = 0
+
+    def abort(self):
+        """丢弃当前未提交的分片"""
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._tmp_path)
+            self._writer = None
+        self._buffer = []
+        self.part_rows = 0
+
+
+class ColumnarDataset:
+    """票据表 + OCR文本行表的追加写入器
+
+    add_page 写入一页的解析结果和OCR文本行；close（或 with 正常结束）时提交分片，
+    出现异常时丢弃未提交的分片
+    """
+
+    def __init__(self, dataset_dir, fmt=DEFAULT_FORMAT, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.dataset_dir = dataset_dir
+        self.invoices = ColumnarWriter(os.path.join(dataset_dir, INVOICE_TABLE), INVOICE_COLUMNS, fmt, row_group_size)
+        self.lines = ColumnarWriter(os.path.join(dataset_dir, LINE_TABLE), LINE_COLUMNS, fmt, row_group_size * 32)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_page(self, row, result, source, page):
+        """写入一页：page 为页码（从1开始）"""
+        self.invoices.append(invoice_record(row, source, page))
+        if result is not None:
+            self.lines.extend(line_records(result, source, page))
+
+    def should_commit(self):
+        """当前分片是否已达到 PART_ROWS 行"""
+        return self.invoices.part_rows >= PART_ROWS
+
+    def commit(self):
+        self.invoices.commit()
+        self.lines.commit()
+
+    def close(self):
+        self.commit()
+
+    def abort(self):
+        self.invoices.abort()
+        self.lines.abort()
+
+
+def write_invoices(rows, path, fmt=None):
+    """把一组解析结果写成单个 Parquet / Arrow 文件（格式按扩展名判断），如查看器另存为"""
+    fmt = fmt or ("arrow" if path.lower().endswith((".arrow", ".feather")) else "parquet")
+    writer = ColumnarWriter(os.path.dirname(os.path.abspath(path)), INVOICE_COLUMNS, fmt, path=path)
+    try:
+        for row in rows:
+            writer.append(invoice_record(row))
+        writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    return path
+
+
+# -------------------------- 读取 --------------------------
+def _dataset(dataset_dir, table, fmt):
+    require_pyarrow()
+    import pyarrow.dataset as ds
+
+    return ds.dataset(os.path.join(dataset_dir, table), format="ipc" if fmt == "arrow" else fmt,
+                      schema=_schema(INVOICE_COLUMNS if table == INVOICE_TABLE else LINE_COLUMNS))
+
+
+def invoice_filter(date_from=None, date_to=None, seller_tax_id=None):
+    """开票日期区间（含两端）/ 销售方统一信用代码 的过滤表达式，条件都为空时返回None"""
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if date_from is not None:
+        conditions.append(ds.field("开票日期") >= to_date(date_from))
+    if date_to is not None:
+        conditions.append(ds.field("开票日期") <= to_date(date_to))
+    if seller_tax_id:
+        conditions.append(ds.field("销售方统一信用代码") == seller_tax_id)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_invoices(dataset_dir, date_from=None, date_to=None, seller_tax_id=None, columns=None,
+                  fmt=DEFAULT_FORMAT):
+    """读取票据表，过滤条件下推到行组统计信息（Parquet），返回 pyarrow.Table"""
+    return _dataset(dataset_dir, INVOICE_TABLE, fmt).to_table(
+        columns=columns, filter=invoice_filter(date_from, date_to, seller_tax_id))
+
+
+def read_lines(dataset_dir, source=None, page=None, columns=None, fmt=DEFAULT_FORMAT):
+    """读取OCR文本行表，可按来源文件/页码过滤，返回 pyarrow.Table"""
+    import pyarrow.dataset as ds
+
+    expression = None
+    if source is not None:
+        expression = ds.field(SOURCE_FILE_KEY) == source
+    if page is not None:
+        condition = ds.field(SOURCE_PAGE_KEY) == page
+        expression = condition if expression is None else expression & condition
+    return _dataset(dataset_dir, LINE_TABLE, fmt).to_table(columns=columns, filter=expression)
@@ -0,0 +1,500 @@
+"""
+OCR识别引擎 - 多进程并行版
+功能：将PDF页面分发到进程池并行识别，每个工作进程只加载一次PaddleOCR模型，结果按页序返回
+"""
+
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from .adaptive import SCORE_THRESHOLD, ocr_page_adaptive, ocr_regions_adaptive
+from .layout import flatten_regions, matches_template, parse_invoice_key, region_rects, split_lines_by_region
+from .page_hash import PageHashIndex, page_hash
+from .render import load_image, render_page
+from .text_layer import extract_text_layer
+
+# -------------------------- 配置参数 --------------------------
+# 默认工作进程数，可通过环境变量 OCR_WORKERS 覆盖
+DEFAULT_WORKERS = int(os.environ.get("OCR_WORKERS", 0)) or os.cpu_count() or 1
+DEFAULT_LANG = "ch"
+DEFAULT_ZOOM = 2.0
+
+# 结果来源：文本层直接提取 / 缓存命中 / OCR推理 / 识别出错（仅批量任务）/ 发票库中已有的重复发票 /
+#          复用相似页面（近似重复的扫描件）的结果
+SOURCE_TEXT = "text"
+SOURCE_CACHE = "cache"
+SOURCE_OCR = "ocr"
+SOURCE_ERROR = "error"
+SOURCE_DUPLICATE = "duplicate"
+SOURCE_SIMILAR = "similar"
+SOURCE_LABELS = {SOURCE_TEXT: "（文本层）", SOURCE_CACHE: "（缓存）", SOURCE_OCR: "", SOURCE_ERROR: "（出错）",
+                 SOURCE_DUPLICATE: "（重复发票，已跳过）", SOURCE_SIMILAR: "（复用相似页面）"}
+PROBE_TEMPLATE = "vat"  # 去重预检时按该版式模板的 meta 区域（发票代码、号码）识别
+
+# -------------------------- 工作进程 --------------------------
+# 以下全局变量在每个工作进程中各有一份
+_worker_ocr = None
+_worker_model = None
+_worker_cache = None
+_worker_store = None
+_worker_pages = None
+_worker_doc = None
+_worker_doc_path = None
+
+
+def _init_worker(lang, cpu_threads, cache=None, server=None, store_path=None, page_hash_path=None, backend=None):
+    """进程初始化：每个工作进程只创建一次PaddleOCR模型
+
+    server 为常驻OCR服务地址时不加载模型，推理请求发给服务（由服务合并成批）；
+    backend 为自定义OCR后端时（如基准测试的桩后端）调用它创建识别对象，不加载PaddleOCR；
+    store_path 为发票库路径时，PDF页面在完整识别前先按发票号码查库去重；
+    page_hash_path 为相似页面索引路径时，扫描页面先按感知哈希查找可复用的识别结果
+    """
+    global _worker_ocr, _worker_model, _worker_cache, _worker_store, _worker_pages
+    _worker_cache = cache
+    # 单进程模式下全局变量在引擎之间共用：先关闭上一个引擎的发票库和相似页面索引，未启用时置空
+    if _worker_store is not None:
+        _worker_store.close()
+    _worker_store = None
+    if store_path:
+        from .store import InvoiceStore
+        _worker_store = InvoiceStore(store_path)
+    if _worker_pages is not None:
+        _worker_pages.close()
+    _worker_pages = PageHashIndex(page_hash_path) if page_hash_path else None
+    if backend is not None:
+        _worker_ocr = backend()
+        _worker_model = getattr(_worker_ocr, "model", {"backend": type(_worker_ocr).__name__})
+        return
+    if server:
+        from .service import OCRClient
+        _worker_ocr = OCRClient(server)
+        _worker_model = _worker_ocr.model
+        return
+
+    # 限制单进程推理线程数，避免多个进程互相抢占CPU
+    os.environ["OMP_NUM_THREADS"] = str(cpu_threads)
+    import paddleocr
+    _worker_ocr = paddleocr.PaddleOCR(lang=lang, cpu_threads=cpu_threads)
+    # 模型标识参与缓存键，升级PaddleOCR或切换语言后旧缓存自动失效
+    _worker_model = {"lang": lang, "paddleocr": getattr(paddleocr, "__version__", "")}
+
+
+def _get_worker_doc(pdf_path):
+    """在工作进程中打开PDF，同一文档的连续页面复用同一个句柄"""
+    global _worker_doc, _worker_doc_path
+    if _worker_doc_path != pdf_path:
+        if _worker_doc is not None:
+            _worker_doc.close()
+        _worker_doc = fitz.open(pdf_path)
+        _worker_doc_path = pdf_path
+    return _worker_doc
+
+
+def _to_result(result):
+    """将PaddleOCR预测结果转换为可跨进程传递的字典"""
+    if not result or len(result) == 0:
+        return {"rec_texts": [], "rec_scores": [], "rec_boxes": []}
+    return _convert(result[0])
+
+
+def _convert(res):
+    """转换单张图片的预测结果"""
+    boxes = res.get('rec_boxes')
+    return {
+        "rec_texts": list(res.get('rec_texts', [])),
+        "rec_scores": [float(s) for s in res.get('rec_scores', [])],
+        "rec_boxes": np.asarray(boxes).tolist() if boxes is not None else [],
+    }
+
+
+def _infer(img_array):
+    """单张图片推理"""
+    return _to_result(_worker_ocr.predict(img_array))
+
+
+def _infer_batch(images):
+    """多张图片一次推理"""
+    if not images:
+        return []
+    return [_convert(res) for res in _worker_ocr.predict(images)]
+
+
+def _predict(img_array, render_settings, infer=None):
+    """识别一张图片（或一组区域图片），启用缓存时先按像素哈希查缓存
+
+    infer 为自定义推理过程（如自适应分辨率），默认直接识别 img_array
+    """
+    infer = infer or (lambda: _infer(img_array))
+
+    if _worker_cache is None:
+        result = infer()
+        result["source"] = SOURCE_OCR
+        return result
+
+    key = _worker_cache.make_key(img_array, {"model": _worker_model, "render": render_settings})
+    result = _worker_cache.get(key)
+    if result is not None:
+        result["source"] = SOURCE_CACHE
+        return result
+
+    result = infer()
+    _worker_cache.put(key, result)
+    result["source"] = SOURCE_OCR
+    return result
+
+
+def _probe_key(page, zoom, text_result):
+    """只取票头的发票代码/号码，没有识别出时返回None
+
+    有文本层时直接用文本层；否则只OCR票头右侧的 meta 区域（约占页面7%的像素）
+    """
+    if text_result is not None:
+        texts = text_result["rec_texts"]
+    else:
+        clip = region_rects(page, PROBE_TEMPLATE)["meta"]
+        texts = _predict(render_page(page, zoom, clip=clip), {"zoom": zoom, "probe": "meta"})["rec_texts"]
+    return parse_invoice_key("\n".join(texts))
+
+
+def _find_duplicate(pdf_path, page_index, key):
+    """去重预检：发票已由其他来源写入发票库时返回跳过结果，否则返回None"""
+    record = _worker_store.find_duplicate(key, pdf_path, page_index) if key else None
+    if record is None:
+        return None
+    return {"rec_texts": [], "rec_scores": [], "rec_boxes": [], "source": SOURCE_DUPLICATE,
+            "duplicate": {"key": list(key), **record}}
+
+
+def _reuse_similar(pdf_path, page_index, page, zoom, key, render_settings, run):
+    """相似页面复用：找到近似重复且发票代码/号码一致的页面时直接返回其OCR结果，
+    否则执行 run() 识别，并把结果登记到相似页面索引
+
+    key 为已探测出的发票代码/号码，None表示有候选页面时再探测
+    """
+    if _worker_pages is None:
+        return run()
+
+    settings = {"model": _worker_model, "render": render_settings}
+    value = page_hash(page)
+    nearby = _worker_pages.nearby(value, settings)
+    if nearby:
+        key = key or _probe_key(page, zoom, None)
+        match = _worker_pages.match(nearby, key) if key else None
+        if match is not None:
+            result = match["result"]
+            result["source"] = SOURCE_SIMILAR
+            result["similar"] = {"source_path": match["source_path"], "page": match["page"]}
+            return result
+
+    result = run()
+    key = parse_invoice_key("\n".join(result["rec_texts"]))
+    if key:
+        _worker_pages.add(value, settings, key, {k: v for k, v in result.items() if k != "source"},
+                          pdf_path, page_index)
+    return result
+
+
+def _ocr_pdf_page(pdf_path, page_index, zoom, use_text_layer, adaptive=None, dedupe=True):
+    """工作进程任务：渲染并识别PDF的一页；页面有可用文本层时直接读取，跳过OCR
+
+    adaptive 为 (起始缩放, 置信度阈值) 时先低分辨率识别，再按需以 zoom 高分辨率复核；
+    dedupe 为True时：启用发票库时库中已有的发票直接返回跳过结果，启用相似页面索引时复用近似重复页面的结果
+    """
+    page = _get_worker_doc(pdf_path)[page_index]
+    text_result = extract_text_layer(page, zoom) if use_text_layer else None
+
+    key = _probe_key(page, zoom, text_result) if dedupe and _worker_store is not None else None
+    duplicate = _find_duplicate(pdf_path, page_index, key)
+    if duplicate is not None:
+        return duplicate
+
+    if text_result is not None:
+        text_result["source"] = SOURCE_TEXT
+        return text_result
+
+    if adaptive:
+        low_zoom, threshold = adaptive
+        settings = {"zoom": low_zoom, "adaptive": [zoom, threshold]}
+
+        def run():
+            low_img = render_page(page, low_zoom)
+            return _predict(
+                low_img, settings,
+                lambda: ocr_page_adaptive(page, _infer, _infer_batch, low_img, low_zoom, zoom, threshold),
+            )
+    else:
+        settings = {"zoom": zoom}
+
+        def run():
+            return _predict(render_page(page, zoom), settings)
+
+    if not dedupe:
+        return run()
+    return _reuse_similar(pdf_path, page_index, page, zoom, key, settings, run)
+
+
+def _ocr_pdf_page_regions(pdf_path, page_index, zoom, use_text_layer, template, adaptive=None):
+    """工作进程任务：只裁剪版式模板中的区域批量识别
+
+    返回结果额外包含 regions（区域名 → 识别结果）；版式不匹配时 regions 为None，
+    并回退为整页识别。adaptive 与 _ocr_pdf_page 相同：区域先低分辨率识别，低置信度的区域再按 zoom 复核
+    """
+    page = _get_worker_doc(pdf_path)[page_index]
+    rects = region_rects(page, template)
+    result = extract_text_layer(page, zoom) if use_text_layer else None
+
+    # 扫描页去重预检直接识别模板自身的 meta 区域，区域识别时复用，不再识别第二次
+    probe = probe_img = None
+    if _worker_store is not None and result is None and "meta" in rects:
+        probe_img = render_page(page, zoom, clip=rects["meta"])
+        probe = _predict(probe_img, {"zoom": zoom, "probe": "meta"})
+        key = parse_invoice_key("\n".join(probe["rec_texts"]))
+    else:
+        key = _probe_key(page, zoom, result) if _worker_store is not None else None
+    duplicate = _find_duplicate(pdf_path, page_index, key)
+    if duplicate is not None:
+        duplicate["regions"] = None
+        return duplicate
+
+    # 原生数字PDF：直接把文本层的行按位置归入各区域
+    if result is not None:
+        regions = split_lines_by_region(result, rects, zoom)
+        result["regions"] = regions if matches_template(regions, template) else None
+        result["source"] = SOURCE_TEXT
+        return result
+
+    if adaptive:
+        low_zoom, threshold = adaptive
+        settings = {"zoom": low_zoom, "adaptive": [zoom, threshold], "regions": list(rects)}
+    else:
+        low_zoom = zoom
+        settings = {"zoom": zoom, "regions": list(rects)}
+
+    def run():
+        todo = {name: rect for name, rect in rects.items() if probe is None or name != "meta"}
+        crops = [render_page(page, low_zoom, clip=rect) for rect in todo.values()]
+
+        def infer():
+            if adaptive:
+                found = ocr_regions_adaptive(page, _infer_batch, todo, crops, low_zoom, zoom, threshold)
+            else:
+                found = dict(zip(todo, _infer_batch(crops)))
+            if probe is not None:
+                found["meta"] = {k: v for k, v in probe.items() if k != "source"}
+            regions = {name: found[name] for name in rects}  # 保持模板中的区域顺序
+            result = flatten_regions(regions)
+            result["regions"] = regions
+            return result
+
+        # 缓存键覆盖所有区域的像素（复用的 meta 区域按预检时的像素计入）
+        if probe is None:
+            result = _predict(crops, settings, infer)
+        else:
+            result = _predict(crops + [probe_img], dict(settings, probe="meta"), infer)
+        if matches_template(result["regions"], template):
+            return result
+
+        # 版式不匹配（非标准发票）：整页识别
+        result = _ocr_pdf_page(pdf_path, page_index, zoom, False, adaptive, dedupe=False)
+        result["regions"] = None
+        return result
+
+    return _reuse_similar(pdf_path, page_index, page, zoom, key, settings, run)
+
+
+def _ocr_image(image):
+    """工作进程任务：识别一张图片（文件路径或numpy数组）"""
+    if isinstance(image, str):
+        image = load_image(image)
+    return _predict(image, {"source": "image"})
+
+
+def _ocr_input_page(path, page_index, zoom, use_text_layer, adaptive, template):
+    """工作进程任务（批量）：识别一个输入文件的一页，page_index 为None表示图片文件
+
+    出错时返回带 error 字段的空结果，单个损坏文件不会中断整批任务
+    """
+    try:
+        if page_index is None:
+            return _ocr_image(path)
+        if template:
+            return _ocr_pdf_page_regions(path, page_index, zoom, use_text_layer, template, adaptive)
+        return _ocr_pdf_page(path, page_index, zoom, use_text_layer, adaptive)
+    except Exception as e:
+        return {"rec_texts": [], "rec_scores": [], "rec_boxes": [],
+                "source": SOURCE_ERROR, "error": f"{type(e).__name__}: {e}"}
+
+
+def _ocr_image_batch(images):
+    """工作进程任务：一次推理一批图片；启用缓存时只推理未命中的图片"""
+    settings = {"model": _worker_model, "render": {"source": "image"}}
+    results = [None] * len(images)
+    keys = [None] * len(images)
+
+    if _worker_cache is not None:
+        for i, image in enumerate(images):
+            keys[i] = _worker_cache.make_key(image, settings)
+            cached = _worker_cache.get(keys[i])
+            if cached is not None:
+                cached["source"] = SOURCE_CACHE
+                results[i] = cached
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(missing, _infer_batch([images[i] for i in missing])):
+        if _worker_cache is not None:
+            _worker_cache.put(keys[i], result)
+        result["source"] = SOURCE_OCR
+        results[i] = result
+
+    return results
+
+
+# -------------------------- 引擎 --------------------------
+class OCREngine:
+    """共享OCR引擎：进程池并行识别，结果按页序返回"""
+
+    def __init__(self, workers=None, lang=DEFAULT_LANG, zoom=DEFAULT_ZOOM, cache=None,
+                 use_text_layer=True, adaptive_zoom=None, score_threshold=SCORE_THRESHOLD, server=None,
+                 store_path=None, page_hash_path=None, backend=None):
+        self.workers = max(1, workers or DEFAULT_WORKERS)
+        self.lang = lang
+        self.server = server  # 常驻OCR服务地址，如 http://127.0.0.1:8868；None表示在本地进程加载模型
+        self.zoom = zoom
+        self.cache = cache  # OCRCache实例，None表示不使用缓存
+        self.store_path = store_path  # 发票库路径，PDF页面完整识别前先查库去重；None表示不去重
+        self.page_hash_path = page_hash_path  # 相似页面索引路径，近似重复的扫描页面复用结果；None表示不启用
+        # 自定义OCR后端：可pickle的无参可调用对象，返回带 predict 方法（与PaddleOCR.predict一致）的识别对象
+        self.backend = backend
+        self.use_text_layer = use_text_layer  # 原生数字PDF直接读取文本层
+        # 自适应分辨率：先按 adaptive_zoom 识别，低于 score_threshold 的区域再按 zoom 复核
+        self.adaptive = (adaptive_zoom, score_threshold) if adaptive_zoom else None
+        self.doc_stats = Counter()  # 最近一份文档各来源的页数
+        # 每个进程分到的推理线程数，总线程数约等于CPU核心数
+        self.cpu_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._executor = None
+        self._local_ready = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _ensure_started(self):
+        """按需启动：单进程模式在当前进程加载模型，否则创建进程池"""
+        if self.workers == 1:
+            if not self._local_ready:
+                _init_worker(self.lang, self.cpu_threads, self.cache, self.server, self.store_path,
+                             self.page_hash_path, self.backend)
+                self._local_ready = True
+        elif self._executor is None:
+            if self.page_hash_path:
+                PageHashIndex(self.page_hash_path).close()  # 先在主进程建表，工作进程只读写
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.lang, self.cpu_threads, self.cache, self.server, self.store_path,
+                          self.page_hash_path, self.backend),
+            )
+
+    def _imap(self, func, args_list):
+        """有序并行映射：最多保持 workers*2 个任务在途，按提交顺序产出结果"""
+        self._ensure_started()
+
+        if self._executor is None:
+            for args in args_list:
+                yield func(*args)
+            return
+
+        pending = deque()
+        max_pending = self.workers * 2
+        for args in args_list:
+            pending.append(self._executor.submit(func, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def page_count(self, pdf_path):
+        """获取PDF页数"""
+        with fitz.open(pdf_path) as pdf_doc:
+            return len(pdf_doc)
+
+    def _page_indices(self, pdf_path, pages):
+        return range(self.page_count(pdf_path)) if pages is None else pages
+
+    def iter_pdf(self, pdf_path, zoom=None, pages=None):
+        """逐页产出PDF的OCR结果（按页序），同时统计各来源页数；pages 为要识别的页序号，None表示全部"""
+        zoom = zoom or self.zoom
+        self.doc_stats = Counter()
+        args_list = ((pdf_path, idx, zoom, self.use_text_layer, self.adaptive)
+                     for idx in self._page_indices(pdf_path, pages))
+        for result in self._imap(_ocr_pdf_page, args_list):
+            self.doc_stats[result["source"]] += 1
+            yield result
+
+    def iter_pdf_regions(self, pdf_path, template="vat", zoom=None, pages=None):
+        """按版式模板逐页只识别所需区域（按页序），结果的 regions 字段为各区域识别结果"""
+        zoom = zoom or self.zoom
+        self.doc_stats = Counter()
+        args_list = ((pdf_path, idx, zoom, self.use_text_layer, template, self.adaptive)
+                     for idx in self._page_indices(pdf_path, pages))
+        for result in self._imap(_ocr_pdf_page_regions, args_list):
+            self.doc_stats[result["source"]] += 1
+            yield result
+
+    def iter_pages(self, tasks, template=None, zoom=None):
+        """批量识别多个文件：tasks 中每个元素以 (文件路径, 页序号) 开头，图片文件的页序号为None
+
+        各文件的页面连续提交到进程池，文件之间不等待；按输入顺序产出 (task, 结果)
+        """
+        zoom = zoom or self.zoom
+        self.doc_stats = Counter()
+        submitted = deque()
+
+        def args_list():
+            for task in tasks:
+                submitted.append(task)
+                path, page_index = task[:2]
+                yield path, page_index, zoom, self.use_text_layer, self.adaptive, template
+
+        for result in self._imap(_ocr_input_page, args_list()):
+            self.doc_stats[result["source"]] += 1
+            yield submitted.popleft(), result
+
+    def report(self):
+        """最近一份文档（或一批文件）的处理报告：多少页跳过了OCR"""
+        total = sum(self.doc_stats.values())
+        skipped = self.doc_stats[SOURCE_TEXT] + self.doc_stats[SOURCE_CACHE]
+        report = (f"共 {total} 页，跳过OCR {skipped} 页"
+                  f"（文本层 {self.doc_stats[SOURCE_TEXT]} 页，缓存 {self.doc_stats[SOURCE_CACHE]} 页），"
+                  f"OCR推理 {self.doc_stats[SOURCE_OCR]} 页")
+        if self.doc_stats[SOURCE_SIMILAR]:
+            report += f"，复用相似页面 {self.doc_stats[SOURCE_SIMILAR]} 页"
+        if self.doc_stats[SOURCE_DUPLICATE]:
+            report += f"，重复发票跳过 {self.doc_stats[SOURCE_DUPLICATE]} 页"
+        if self.doc_stats[SOURCE_ERROR]:
+            report += f"，出错 {self.doc_stats[SOURCE_ERROR]} 页"
+        return report
+
+    def ocr_pdf(self, pdf_path, zoom=None):
+        """识别PDF所有页面，返回按页序排列的结果列表"""
+        return list(self.iter_pdf(pdf_path, zoom))
+
+    def iter_images(self, images):
+        """逐张产出图片的OCR结果（按输入顺序）"""
+        yield from self._imap(_ocr_image, ((image,) for image in images))
+
+    def iter_batches(self, batches):
+        """按批推理：batches 中每个元素是一批已解码的图片数组，逐批产出结果列表"""
+        yield from self._imap(_ocr_image_batch, ((batch,) for batch in batches))
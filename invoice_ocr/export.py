@@ -0,0 +1,204 @@
+"""
+Excel报表导出
+功能：各票据识别脚本的报表版式统一放在这里，按名称选择（与解析规则同名）；
+      只写模式流式写出，内存占用与行数无关
+"""
+
+from datetime import datetime
+
+# -------------------------- 报表版式 --------------------------
+# title:       标题行文字，None表示表头直接从第1行开始
+# left_after:  该列之后的数据左对齐，之前的居中
+# widths:      列宽列表 / 统一列宽 / "auto"（按内容自适应，最大50）
+REPORT_LAYOUTS = {
+    "enhanced": {
+        "title": "票据识别结果表 - 增强OCR版",
+        "headers": [
+            "票据序号", "票据类型", "发票代码", "发票号码", "开票日期",
+            "购买方名称", "购买方统一信用代码", "销售方名称", "销售方统一信用代码",
+            "项目名称", "金额（不含税）", "税率(%)", "税额", "价税合计"
+        ],
+        "header_font_size": 10,
+        "header_wrap": True,
+        "left_after": 4,
+        "widths": [8, 12, 15, 12, 15, 25, 20, 25, 20, 20, 12, 8, 12, 12],
+        "freeze": "A4",
+    },
+    "cloudcode": {
+        "title": None,
+        "headers": [
+            "票据序号", "票据类型", "购买方名称", "购买方统一信用代码",
+            "销售方名称", "销售方统一信用代码", "项目名称", "金额（不含税）",
+            "税率(%)", "税额", "价税合计", "备注"
+        ],
+        "header_font_size": 11,
+        "header_wrap": False,
+        "left_after": 2,
+        "widths": "auto",
+        "freeze": None,
+    },
+    "cloudcode_234": {
+        "title": "票据识别结果表 - 234.pdf OCR识别",
+        "headers": [
+            "票据序号", "票据类型", "购买方名称", "购买方统一信用代码",
+            "销售方名称", "销售方统一信用代码", "项目名称", "金额（不含税）",
+            "税率(%)", "税额", "价税合计", "备注"
+        ],
+        "header_font_size": 11,
+        "header_wrap": True,
+        "left_after": 2,
+        "widths": 18,
+        "freeze": "A4",
+    },
+}
+DEFAULT_LAYOUT = "enhanced"
+EXTRA_COLUMN_WIDTH = 20  # 附加列（如来源文件）的列宽
+AUTO_WIDTH_SAMPLE = 200  # 流式写出时，自适应列宽按开头多少行估算
+
+
+def get_layout(name):
+    """按名称获取报表版式"""
+    try:
+        return REPORT_LAYOUTS[name]
+    except KeyError:
+        raise ValueError(f"未知的报表版式: {name}，可选: {', '.join(REPORT_LAYOUTS)}") from None
+
+
+def _column_widths(layout, rows, headers):
+    """计算各列列宽；"auto" 版式按 rows（流式写出时为开头的样本行）的内容估算"""
+    widths = layout["widths"]
+    if widths == "auto":
+        return [min(max(len(str(value)) for value in
+                        [header] + [row.get(header, "") for row in rows]) + 2, 50)
+                for header in headers]
+    if isinstance(widths, list):
+        return widths + [EXTRA_COLUMN_WIDTH] * (len(headers) - len(widths))
+    return [widths] * len(headers)
+
+
+class ExcelWriter:
+    """流式Excel报表：只写模式逐行写出，行写出后不再驻留内存，样式对象全表共用
+
+    total 为总页数（标题行“共识别 N 页”），未知时用公式统计数据行数；
+    列宽为 "auto" 的版式先缓存开头 AUTO_WIDTH_SAMPLE 行用于估算列宽，之后直接写出
+    """
+
+    def __init__(self, output_path, layout=DEFAULT_LAYOUT, title=None, extra_headers=(), total=None):
+        # 按需导入：OCR工作进程也会导入本包，不需要加载openpyxl
+        from openpyxl import Workbook
+        from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+        from openpyxl.styles.borders import DEFAULT_BORDER
+        from openpyxl.styles.fonts import DEFAULT_FONT
+
+        self.output_path = output_path
+        self.layout = get_layout(layout)
+        self.headers = self.layout["headers"] + list(extra_headers)
+        self.title = title or self.layout["title"]
+        self.total = total
+        self.row_count = 0
+        self._pending = []  # 列宽确定前缓存的行
+        self._started = False
+
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("票据识别结果")
+
+        # 样式只注册一次（命名样式），单元格按名称引用，不再为每个单元格创建和比对样式对象
+        thin = Side(style="thin")
+        border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        center = Alignment(horizontal="center", vertical="center")
+        styles = {
+            "报表标题": dict(font=Font(size=18, bold=True, color='1F4E78'), alignment=center),
+            "报表日期": dict(font=Font(size=11, color='0070C0')),
+            "报表表头": dict(font=Font(bold=True, color="FFFFFF", size=self.layout["header_font_size"]),
+                         fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+                         alignment=Alignment(horizontal="center", vertical="center",
+                                             wrap_text=self.layout["header_wrap"] or None),
+                         border=border),
+            "数据居中": dict(alignment=center, border=border),
+            "数据左对齐": dict(alignment=Alignment(horizontal="left", vertical="center"), border=border),
+        }
+        for name, attrs in styles.items():
+            self._wb.add_named_style(NamedStyle(name=name, **{"font": DEFAULT_FONT, "border": DEFAULT_BORDER, **attrs}))
+        self._column_styles = ["数据左对齐" if col > self.layout["left_after"] else "数据居中"
+                               for col in range(1, len(self.headers) + 1)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _cell(self, value, style):
+        from openpyxl.cell import WriteOnlyCell
+
+        cell = WriteOnlyCell(self._ws, value=value)
+        cell.style = style
+        return cell
+
+    def _start(self):
+        """写出表头：列宽、冻结窗格、合并单元格须在第一行写出前设置"""
+        from openpyxl.utils import get_column_letter
+
+        ws = self._ws
+        for col_idx, width in enumerate(_column_widths(self.layout, self._pending, self.headers), 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = width
+        if self.layout["freeze"]:
+            ws.freeze_panes = self.layout["freeze"]
+
+        if self.title:
+            last_col = get_column_letter(len(self.headers))
+            ws.merged_cells.add(f'A1:{last_col}1')
+            ws.merged_cells.add(f'A2:{last_col}2')
+            ws.append([self._cell(self.title, "报表标题")])
+            date = datetime.now().strftime("%Y年%m月%d日")
+            if self.total is not None:
+                summary = f'制表日期: {date}  |  共识别 {self.total} 页'
+            else:
+                summary = f'="制表日期: {date}  |  共识别 "&COUNTA(A4:A1048576)&" 页"'
+            ws.append([self._cell(summary, "报表日期")])
+
+        ws.append([self._cell(header, "报表表头") for header in self.headers])
+        self._started = True
+
+    def _write(self, data):
+        self._ws.append([self._cell(data.get(key, ""), style)
+                         for key, style in zip(self.headers, self._column_styles)])
+
+    def append(self, row):
+        """写出一行记录（字典，按表头取值）"""
+        self.row_count += 1
+        if not self._started:
+            if self.layout["widths"] == "auto" and len(self._pending) < AUTO_WIDTH_SAMPLE:
+                self._pending.append(row)
+                return
+            self._start()
+            self._flush_pending()
+        self._write(row)
+
+    def _flush_pending(self):
+        for data in self._pending:
+            self._write(data)
+        self._pending = []
+
+    def close(self):
+        """写出剩余行并保存文件"""
+        if self._wb is None:
+            return
+        if not self._started:
+            self._start()
+            self._flush_pending()
+        self._wb.save(self.output_path)
+        self._wb = None
+        print(f"\n[OK] Excel已生成：{self.output_path}")
+
+
+def write_excel(rows, output_path, layout=DEFAULT_LAYOUT, title=None, extra_headers=()):
+    """按版式生成Excel报表
+
+    title 覆盖版式默认的标题行文字；extra_headers 为追加在表头末尾的列（如来源文件）
+    """
+    rows = list(rows)
+    with ExcelWriter(output_path, layout, title, extra_headers, total=len(rows)) as writer:
+        for row in rows:
+            writer.append(row)
+    return output_path
@@ -0,0 +1,264 @@
+"""
+发票字段提取引擎
+功能：导入时一次性预编译全部字段正则，解析时直接调用编译好的匹配方法，
+      按字段内的模式优先级取第一个有效结果，命中后立即停止该字段的其余模式
+
+模式编写约定（保证匹配耗时随文本长度线性增长，噪声OCR文本不会卡死）：
+- 标签与标签之间的跨度一律限定长度，如 .{0,50}? ，不使用无界的 .*?
+- 不嵌套量词，如 ([^\s]+(?:\s+[^\s]+)*?) 改为单个有界量词
+- 相邻的可选部分不能匹配同样的字符，如 \s*[￥¥]?\s* 改为 \s*(?:[￥¥]\s*)?
+"""
+
+import re
+import time
+from datetime import date
+
+# -------------------------- 配置参数 --------------------------
+PAGE_TIME_BUDGET = 0.5  # 单页字段提取的时间预算（秒），超出后跳过剩余字段
+
+# -------------------------- 金额转换 --------------------------
+_CHINESE_AMOUNT_CHARS = '壹贰叁肆伍陆柒捌玖拾佰仟万亿元整角分'
+
+
+def _clean_amount(value):
+    """去掉货币符号和千分位"""
+    return value.replace('¥', '').replace('￥', '').replace(',', '').strip()
+
+
+def to_text(value):
+    """文本字段：去掉首尾空白"""
+    return value.strip()
+
+
+def to_amount(value):
+    """金额字段：转为浮点数，无法转换时返回None（继续尝试下一个模式）"""
+    try:
+        return float(_clean_amount(value))
+    except ValueError:
+        return None
+
+
+def to_amount_lowercase(value):
+    """价税合计：过滤掉大写金额，只接受阿拉伯数字"""
+    value = _clean_amount(value)
+    if any(c in value for c in _CHINESE_AMOUNT_CHARS):
+        return None
+    return to_amount(value)
+
+
+def to_number(value):
+    """数值字段（如税率）"""
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+_DATE = re.compile(r'(\d{4})\D{1,3}(\d{1,2})\D{1,3}(\d{1,2})')
+
+
+def to_date(value):
+    """日期字段：'2025年01月02日' / '2025-01-02' → date，无法识别时返回None"""
+    if isinstance(value, date):
+        return value
+    match = _DATE.search(str(value or ""))
+    if not match:
+        return None
+    try:
+        return date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+# -------------------------- 提取引擎 --------------------------
+class FieldExtractor:
+    """多字段提取器
+
+    fields 为 (字段名, 模式列表, 转换函数) 列表，所有模式在构造时一次性编译。
+    每个字段按模式顺序取各模式最左侧的匹配，转换函数返回None表示该匹配无效，继续尝试下一个模式；
+    字段一旦取到有效值，其余模式不再执行。
+    budget 为单页时间预算（秒，None表示不限制），在字段之间检查，超出后剩余字段按未匹配处理
+    """
+
+    def __init__(self, fields, budget=PAGE_TIME_BUDGET):
+        self.fields = [(name, tuple(re.compile(p).search for p in patterns), convert)
+                       for name, patterns, convert in fields]
+        self.budget = budget
+
+    def extract(self, text):
+        """提取所有字段，返回 {字段名: 值}，未匹配到的字段不出现在结果中"""
+        values = {}
+        deadline = time.perf_counter() + self.budget if self.budget else None
+        for i, (name, searches, convert) in enumerate(self.fields):
+            if deadline is not None and time.perf_counter() > deadline:
+                skipped = "、".join(field[0] for field in self.fields[i:])
+                print(f"  [WARNING] 字段提取超出时间预算（{self.budget}秒），跳过: {skipped}")
+                break
+            for search in searches:
+                m = search(text)
+                if m is None:
+                    continue
+                value = convert(m.group(1))
+                if value is not None:
+                    values[name] = value
+                    break
+        return values
+
+
+# -------------------------- 增强版发票字段 --------------------------
+ENHANCED_FIELDS = [
+    ("发票代码", [
+        r'发票代码[：:]\s*(\d+)',
+        r'代码[：:]\s*(\d{12})',
+    ], to_text),
+    ("发票号码", [
+        r'发票号码[：:]\s*(\d+)',
+        r'号码[：:]\s*(\d{8})',
+    ], to_text),
+    ("开票日期", [
+        r'开票日期[：:]\s*(\d{4}年\d{1,2}月\d{1,2}日)',
+        r'开票日期[：:]\s*(\d{4}-\d{1,2}-\d{1,2})',
+        r'(\d{4}年\d{1,2}月\d{1,2}日)',
+    ], to_text),
+    ("购买方名称", [
+        r'购买方[\s\S]{0,50}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|密区码|$)',
+        r'购[\s\S]{0,30}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|$)',
+        r'客户名称[：:]\s*([^\n]+)',
+        r'抬头[：:]\s*([^\n]+)',
+        r'名称[：:]\s*([^\n]{2,20}?)(?=\s+纳税人识别号)',
+    ], to_text),
+    ("销售方名称", [
+        r'销售方[\s\S]{0,50}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|备注|$)',
+        r'销[\s\S]{0,30}名称[：:]\s*([^\n]+?)(?=\s+纳税人识别号|统一社会信用代码|$)',
+        r'销售商[：:]\s*([^\n]+)',
+        r'商家名称[：:]\s*([^\n]+)',
+    ], to_text),
+    ("购买方统一信用代码", [
+        r'购买方[\s\S]{0,100}纳税人识别号[：:]\s*([A-Z0-9]{18,20})',
+        r'购买方[\s\S]{0,100}统一社会信用代码[：:]\s*([A-Z0-9]{18,20})',
+        r'客户[\s\S]{0,50}税号[：:]\s*([A-Z0-9]{18,20})',
+        r'纳税人识别号[：:]\s*([A-Z0-9]{18,20})',
+    ], to_text),
+    ("销售方统一信用代码", [
+        r'销售方[\s\S]{0,100}纳税人识别号[：:]\s*([A-Z0-9]{18,20})',
+        r'销售方[\s\S]{0,100}统一社会信用代码[：:]\s*([A-Z0-9]{18,20})',
+        r'销售商[\s\S]{0,50}税号[：:]\s*([A-Z0-9]{18,20})',
+    ], to_text),
+    ("项目名称", [
+        r'\*[\u4e00-\u9fa5a-zA-Z0-9]+\*\s*([^\n]+?)(?=\s+规格型号|单位|数量|单价|$)',
+        r'货物或应税劳务[\s\S]{0,20}名称[：:]\s*([^\n]+)',
+        r'项目[：:]\s*([^\n]+)',
+        r'商品名称[：:]\s*([^\n]+)',
+        r'服务名称[：:]\s*([^\n]+)',
+        r'名称[：:]\s*([^\n]{2,30}?)(?=\s+规格型号|单位)',
+    ], to_text),
+    ("价税合计", [
+        r'价税合计[\s\S]{0,20}大写[）:]?\s*([^\n]+)',
+        r'价税合计[\s\S]{0,30}[小写][）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'[（(]小写[）)]\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'合计[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'总金额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount_lowercase),
+    ("税率(%)", [
+        r'税率[】】]?\s*(\d+)%',
+        r'税率[：:]\s*(\d+)',
+    ], to_number),
+    ("税额", [
+        r'税额[\s\S]{0,10}[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'税额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount),
+    ("金额（不含税）", [
+        r'金额[\s\S]{0,10}[不含税][）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'金额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'不含税金额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount),
+]
+
+ENHANCED_EXTRACTOR = FieldExtractor(ENHANCED_FIELDS)
+
+
+# -------------------------- CloudCode版发票字段（345.pdf） --------------------------
+CLOUDCODE_FIELDS = [
+    ("购买方名称", [
+        r'购买方.{0,50}?名称[：:]\s*(\S[\s\S]{0,100}?)(?=\s+纳税人|统一社会信用代码|$)',
+        r'购.{0,50}?名称[：:]\s*(\S+)',
+        r'客户名称[：:]\s*(\S+)',
+        r'抬头[：:]\s*(\S+)',
+    ], to_text),
+    ("销售方名称", [
+        r'销售方.{0,50}?名称[：:]\s*(\S[\s\S]{0,100}?)(?=\s+纳税人|统一社会信用代码|$)',
+        r'销.{0,50}?名称[：:]\s*(\S+)',
+        r'销售商[：:]\s*(\S+)',
+        r'商家名称[：:]\s*(\S+)',
+    ], to_text),
+    ("购买方统一信用代码", [
+        r'购买方.{0,100}?纳税人识别号[：:]\s*([A-Z0-9]+)',
+        r'购买方.{0,100}?统一社会信用代码[：:]\s*([A-Z0-9]+)',
+        r'客户.{0,100}?税号[：:]\s*([A-Z0-9]+)',
+    ], to_text),
+    ("销售方统一信用代码", [
+        r'销售方.{0,100}?纳税人识别号[：:]\s*([A-Z0-9]+)',
+        r'销售方.{0,100}?统一社会信用代码[：:]\s*([A-Z0-9]+)',
+        r'销售商.{0,100}?税号[：:]\s*([A-Z0-9]+)',
+    ], to_text),
+    ("项目名称", [
+        r'\*[\u4e00-\u9fa5a-zA-Z]+\*\s*([^\d\n]{1,100}?)(?=\s+规格型号|单位|数量|单价|$)',
+        r'货物或应税劳务.{0,50}?名称[：:]\s*(\S+)',
+        r'项目[：:]\s*(\S+)',
+        r'商品名称[：:]\s*(\S+)',
+        r'服务名称[：:]\s*(\S+)',
+    ], to_text),
+    ("价税合计", [
+        r'[价税合计][小写][）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'合计[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'总金额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount),
+    ("税率(%)", [
+        r'税率[】】]?\s*(\d+)%',
+    ], to_number),
+    ("税额", [
+        r'[税额][）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'税额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount),
+    ("金额（不含税）", [
+        r'[金额][不含税][）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+        r'金额[）:]?\s*(?:[￥¥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount),
+]
+
+CLOUDCODE_EXTRACTOR = FieldExtractor(CLOUDCODE_FIELDS)
+
+# -------------------------- CloudCode版发票字段（234.pdf） --------------------------
+CLOUDCODE_234_FIELDS = [
+    ("购买方名称", [
+        r'购买方.{0,50}?名称[：:]\s*(\S[\s\S]{0,100}?)(?=\s+纳税人|统一社会信用代码)',
+        r'购.{0,50}?名称[：:]\s*(\S+)',
+    ], to_text),
+    ("销售方名称", [
+        r'销售方.{0,50}?名称[：:]\s*(\S[\s\S]{0,100}?)(?=\s+纳税人|统一社会信用代码)',
+        r'销.{0,50}?名称[：:]\s*(\S+)',
+    ], to_text),
+    ("购买方统一信用代码", [
+        r'购买方.{0,100}?纳税人识别号[：:]\s*([A-Z0-9]+)',
+        r'购买方.{0,100}?统一社会信用代码[：:]\s*([A-Z0-9]+)',
+    ], to_text),
+    ("销售方统一信用代码", [
+        r'销售方.{0,100}?纳税人识别号[：:]\s*([A-Z0-9]+)',
+        r'销售方.{0,100}?统一社会信用代码[：:]\s*([A-Z0-9]+)',
+    ], to_text),
+    ("项目名称", [
+        r'\*[\u4e00-\u9fa5a-zA-Z]+\*\s*([^\d\n]{1,100}?)(?=\s+规格型号|单位|数量|$)',
+        r'货物或应税劳务.{0,50}?名称[：:]\s*(\S+)',
+    ], to_text),
+    ("价税合计", [
+        r'[金额价税合计][^\d,\n]{0,50}([\d,]+\.?\d*)',
+    ], to_amount),
+    ("税率(%)", [
+        r'税率[】】]?\s*(\d+)%',
+    ], to_number),
+    ("税额", [
+        r'税额[】】]?\s*(?:[¥￥]\s*)?([\d,]+\.?\d*)',
+    ], to_amount),
+]
+
+CLOUDCODE_234_EXTRACTOR = FieldExtractor(CLOUDCODE_234_FIELDS)
@@ -0,0 +1,45 @@
+"""
+图片目录批量加载
+功能：按固定批大小读取并解码图片，后台线程预取下一批，推理当前批时磁盘读取不停顿
+"""
+
+import os
+
+from .pipeline import iter_stage
+from .render import load_image
+
+# -------------------------- 配置参数 --------------------------
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_PREFETCH = 2  # 预取的批数
+
+
+def list_images(image_dir):
+    """列出目录下的图片文件名（按文件名排序）"""
+    with os.scandir(image_dir) as entries:
+        return sorted(entry.name for entry in entries
+                      if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def _chunks(items, size):
+    """按固定大小切分列表"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _load_batch(paths):
+    """解码一批图片；无法读取的文件记为None"""
+    images = []
+    for path in paths:
+        try:
+            images.append(load_image(path))
+        except OSError as e:
+            print(f"  [ERROR] 读取图片失败 {path}: {e}")
+            images.append(None)
+    return paths, images
+
+
+def iter_image_batches(paths, batch_size=DEFAULT_BATCH_SIZE, prefetch=DEFAULT_PREFETCH):
+    """逐批产出 (路径列表, 图片数组列表)，下一批在后台线程中预先读取解码"""
+    yield from iter_stage(_chunks(list(paths), batch_size), _load_batch,
+                          maxsize=prefetch, name="image-loader")
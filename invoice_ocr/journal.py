@@ -0,0 +1,70 @@
+"""
+逐页任务日志
+功能：每识别并解析完一页，立即把该页的OCR结果和解析结果追加写入日志并落盘；
+      同一份文档（内容与识别参数都相同）再次运行时从日志恢复已完成的页面，只处理剩余页面
+"""
+
+import hashlib
+import json
+import os
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_JOURNAL_DIR = ".ocr_journal"
+_HASH_CHUNK = 1024 * 1024
+
+
+def document_key(pdf_path, settings):
+    """日志键：文档内容哈希 + 识别参数（参数不同的运行互不干扰）"""
+    h = hashlib.sha256()
+    h.update(json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PageJournal:
+    """一份文档的逐页日志（JSON Lines，每行一页）"""
+
+    def __init__(self, journal_dir, pdf_path, settings):
+        self.path = os.path.join(journal_dir, document_key(pdf_path, settings) + ".jsonl")
+        self.pages = {}  # 页序号 → {"result": OCR结果, "row": 解析结果}
+        self._file = None
+        os.makedirs(journal_dir, exist_ok=True)
+        self._load()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _load(self):
+        """读取已完成的页面；进程被强制结束时写了一半的最后一行忽略"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.pages[record["page"]] = record
+
+    def append(self, page_index, result, row):
+        """记录一页，写入后立即落盘"""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            # 上次中断留下的半行之后另起一行
+            if self._file.tell() > 0:
+                self._file.write("\n")
+        record = {"page": page_index, "result": result, "row": row}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pages[page_index] = record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
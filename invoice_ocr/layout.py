@@ -0,0 +1,215 @@
+"""
+票据版式模板与区域识别
+功能：标准增值税发票各栏位位置固定，只裁剪解析所需的区域（票头、购买方、项目、金额、
+      合计、销售方）批量OCR，按区域定位字段，不再对整页拼接文本做大窗口正则扫描
+"""
+
+import re
+
+import fitz  # PyMuPDF
+
+# -------------------------- 版式模板 --------------------------
+# 区域坐标为相对页面宽高的比例 (x0, y0, x1, y1)，顺序即输出文本的拼接顺序
+VAT_TEMPLATE = {
+    "name": "vat",
+    # 用于判断版式是否匹配：该区域识别结果需包含任一关键词
+    "anchor": ("title", ("发票",)),
+    "regions": {
+        "title": (0.25, 0.00, 0.75, 0.13),    # 发票名称（专用/普通/电子）
+        "meta": (0.66, 0.02, 1.00, 0.20),     # 发票代码、发票号码、开票日期
+        "buyer": (0.02, 0.17, 0.60, 0.37),    # 购买方名称、纳税人识别号
+        "item": (0.02, 0.36, 0.34, 0.68),     # 货物或应税劳务名称
+        "amounts": (0.56, 0.36, 1.00, 0.70),  # 金额、税率、税额
+        "total": (0.02, 0.66, 1.00, 0.79),    # 价税合计
+        "seller": (0.02, 0.77, 0.60, 0.98),   # 销售方名称、纳税人识别号
+    },
+}
+
+TEMPLATES = {"vat": VAT_TEMPLATE}
+
+
+def get_template(template):
+    """按名称或直接传入的字典获取模板"""
+    if isinstance(template, dict):
+        return template
+    if template not in TEMPLATES:
+        raise ValueError(f"未知的版式模板: {template}")
+    return TEMPLATES[template]
+
+
+def region_rects(page, template):
+    """计算模板各区域在页面上的矩形（PDF坐标）"""
+    rect = page.rect
+    rects = {}
+    for name, (x0, y0, x1, y1) in get_template(template)["regions"].items():
+        rects[name] = fitz.Rect(
+            rect.x0 + rect.width * x0, rect.y0 + rect.height * y0,
+            rect.x0 + rect.width * x1, rect.y0 + rect.height * y1,
+        )
+    return rects
+
+
+def matches_template(region_results, template):
+    """检查锚点区域是否包含模板关键词"""
+    anchor_region, keywords = get_template(template)["anchor"]
+    anchor = region_results.get(anchor_region)
+    if not anchor:
+        return False
+    text = "".join(anchor["rec_texts"])
+    return any(keyword in text for keyword in keywords)
+
+
+def split_lines_by_region(result, rects, zoom):
+    """把整页文本行（如文本层结果）按中心点归入各区域，得到与区域OCR相同的结构"""
+    region_results = {name: {"rec_texts": [], "rec_scores": [], "rec_boxes": []} for name in rects}
+    for text, score, box in zip(result["rec_texts"], result["rec_scores"], result["rec_boxes"]):
+        center = fitz.Point((box[0] + box[2]) / 2 / zoom, (box[1] + box[3]) / 2 / zoom)
+        for name, rect in rects.items():
+            if center in rect:
+                region_results[name]["rec_texts"].append(text)
+                region_results[name]["rec_scores"].append(score)
+                region_results[name]["rec_boxes"].append(box)
+    return region_results
+
+
+def flatten_regions(region_results):
+    """按模板区域顺序拼接为整页结果，便于调试输出和统计"""
+    flat = {"rec_texts": [], "rec_scores": [], "rec_boxes": []}
+    for result in region_results.values():
+        for key in flat:
+            flat[key].extend(result[key])
+    return flat
+
+
+# -------------------------- 区域字段解析 --------------------------
+_NUMBER = r'([\d,]+\.\d{1,2}|[\d,]+)'
+_TAX_ID = re.compile(r'[0-9A-Z]{18,20}')
+_CODE = re.compile(r'代码[：:]?\s*(\d{10,12})')
+_NO = re.compile(r'号码[：:]?\s*(\d{8,20})')
+_DATE = re.compile(r'(\d{4}年\d{1,2}月\d{1,2}日|\d{4}-\d{1,2}-\d{1,2})')
+_NAME = re.compile(r'名\s*称[：:]\s*(\S[^\n]*)')
+_ITEM = re.compile(r'\*[\u4e00-\u9fa5a-zA-Z0-9]+\*\s*(\S[^\n]*)')
+_RATE = re.compile(r'(\d{1,2})\s*%')
+# 编写约定同 extraction.py：跨度限定长度，相邻的可选部分不匹配同样的字符；两个金额之间必须有空白或货币符号
+_SUBTOTAL = re.compile(r'合\s*计[^\d￥¥\n]{0,20}(?:[￥¥]\s*)?' + _NUMBER + r'(?:\s*[￥¥]\s*|\s+)' + _NUMBER)
+_TOTAL = re.compile(r'[（(]?小写[）)]?\s*(?:[￥¥]\s*)?' + _NUMBER)
+_AMOUNT = re.compile(r'[￥¥]?\s*(\d[\d,]*\.\d{2})')
+
+
+def _lines(region_results, name):
+    """某区域的文本行列表"""
+    region = region_results.get(name)
+    return [t for t in region["rec_texts"] if t] if region else []
+
+
+def _to_float(value):
+    """金额字符串转浮点数"""
+    try:
+        return float(value.replace(',', ''))
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def _party(lines):
+    """解析购买方/销售方区域：名称 + 统一社会信用代码"""
+    text = "\n".join(lines)
+    name = ""
+    match = _NAME.search(text)
+    if match:
+        # 同一行后面紧跟的识别号等字段截掉
+        name = re.split(r'\s+(?:纳税人|统一社会|地址)', match.group(1))[0].strip()
+    tax_match = _TAX_ID.search(text)
+    return name, tax_match.group(0) if tax_match else ""
+
+
+def parse_invoice_key(text):
+    """从票头文本中取 (发票代码, 发票号码)，用于去重；没有号码时返回None（全电发票没有代码，记为空串）"""
+    number = _NO.search(text)
+    if not number:
+        return None
+    code = _CODE.search(text)
+    return (code.group(1) if code else ""), number.group(1)
+
+
+def parse_invoice_regions(region_results, page_num):
+    """按区域解析发票字段，输出字段与 parse_enhanced 一致"""
+    parsed_data = {
+        "票据序号": page_num + 1,
+        "票据类型": "",
+        "发票代码": "",
+        "发票号码": "",
+        "开票日期": "",
+        "购买方名称": "",
+        "购买方统一信用代码": "",
+        "销售方名称": "",
+        "销售方统一信用代码": "",
+        "项目名称": "",
+        "金额（不含税）": 0.0,
+        "税率(%)": 0.0,
+        "税额": 0.0,
+        "价税合计": 0.0,
+        "备注": ""
+    }
+
+    # 票头：发票类型
+    title = "".join(_lines(region_results, "title"))
+    for invoice_type in ("增值税专用发票", "增值税普通发票", "电子发票", "通用机打发票"):
+        if invoice_type in title:
+            parsed_data["票据类型"] = invoice_type
+            break
+
+    # 票头右侧：代码、号码、日期
+    meta = "\n".join(_lines(region_results, "meta"))
+    for key, pattern in (("发票代码", _CODE), ("发票号码", _NO), ("开票日期", _DATE)):
+        match = pattern.search(meta)
+        if match:
+            parsed_data[key] = match.group(1)
+
+    # 购买方 / 销售方
+    parsed_data["购买方名称"], parsed_data["购买方统一信用代码"] = _party(_lines(region_results, "buyer"))
+    parsed_data["销售方名称"], parsed_data["销售方统一信用代码"] = _party(_lines(region_results, "seller"))
+
+    # 项目名称：优先 *分类*名称 格式，否则取表头下第一行
+    item_lines = _lines(region_results, "item")
+    for line in item_lines:
+        match = _ITEM.search(line)
+        if match:
+            parsed_data["项目名称"] = match.group(1).strip()
+            break
+    else:
+        body = [line for line in item_lines if "名称" not in line and "合计" not in line]
+        if body:
+            parsed_data["项目名称"] = body[0].strip()
+
+    # 金额栏：税率
+    amounts = "\n".join(_lines(region_results, "amounts"))
+    match = _RATE.search(amounts)
+    if match:
+        parsed_data["税率(%)"] = float(match.group(1))
+
+    # 合计行：金额、税额、价税合计
+    total = "\n".join(_lines(region_results, "total"))
+    match = _SUBTOTAL.search(total)
+    if match:
+        parsed_data["金额（不含税）"] = _to_float(match.group(1))
+        parsed_data["税额"] = _to_float(match.group(2))
+    match = _TOTAL.search(total)
+    if match:
+        parsed_data["价税合计"] = _to_float(match.group(1))
+
+    # 合计行缺失时，用金额栏内按阅读顺序出现的前两个金额（金额、税额）
+    if parsed_data["金额（不含税）"] == 0:
+        values = [_to_float(v) for v in _AMOUNT.findall(amounts)]
+        if len(values) >= 2:
+            parsed_data["金额（不含税）"], parsed_data["税额"] = values[0], values[1]
+
+    # 计算逻辑：与整页解析保持一致
+    if parsed_data["价税合计"] > 0:
+        if parsed_data["税额"] == 0 and parsed_data["税率(%)"] > 0:
+            parsed_data["税额"] = round(parsed_data["价税合计"] / (1 + parsed_data["税率(%)"]/100) * (parsed_data["税率(%)"]/100), 2)
+        if parsed_data["金额（不含税）"] == 0:
+            parsed_data["金额（不含税）"] = round(parsed_data["价税合计"] - parsed_data["税额"], 2)
+    elif parsed_data["金额（不含税）"] > 0:
+        parsed_data["价税合计"] = round(parsed_data["金额（不含税）"] + parsed_data["税额"], 2)
+
+    return parsed_data
@@ -0,0 +1,159 @@
+"""
+相似页面索引（感知哈希）
+功能：每页先渲染一张很小的灰度缩略图（短边约128像素）计算64位感知哈希（DCT pHash），
+      在本次任务和历史任务识别过的页面中查找近似重复的页面（如重新扫描的同一张发票），
+      找到时直接复用此前的OCR结果，不再以高分辨率渲染和推理
+
+感知哈希只负责找出候选：同一版式的不同发票在缩略图上几乎一样，
+所以候选还要核对 发票代码 + 发票号码（只识别票头的号码区域）一致才复用；没有识别出号码的页面不复用。
+索引存放在本地SQLite（WAL模式），各OCR工作进程共享
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import fitz  # PyMuPDF
+import numpy as np
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_PAGE_HASH_PATH = ".ocr_pages.db"
+THUMB_SIZE = 128  # 缩略图短边像素数
+HASH_GRID = 32  # 缩略图先按面积平均缩小到 32×32，再做DCT
+HASH_BITS = 8  # 取左上角 8×8 低频系数，共64位
+MAX_DISTANCE = 10  # 两页哈希的汉明距离不超过该值视为候选
+BUSY_TIMEOUT = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    phash INTEGER NOT NULL,
+    settings TEXT NOT NULL,
+    invoice_code TEXT NOT NULL DEFAULT '',
+    invoice_number TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    result_json TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pages_source ON pages (source_path, page, settings);
+"""
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(HASH_GRID)
+
+
+def _shrink(gray, height, width):
+    """按面积平均缩小到 height × width"""
+    rows = np.linspace(0, gray.shape[0], height + 1).astype(int)
+    cols = np.linspace(0, gray.shape[1], width + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(gray, rows[:-1], axis=0), cols[:-1], axis=1)
+    return sums / np.outer(np.diff(rows), np.diff(cols))
+
+
+def page_hash(page):
+    """页面的64位感知哈希（有符号整数，便于存入SQLite）"""
+    zoom = THUMB_SIZE / min(page.rect.width, page.rect.height)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    gray = np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width).astype(np.float32)
+    coeffs = (_DCT @ _shrink(gray, HASH_GRID, HASH_GRID) @ _DCT.T)[:HASH_BITS, :HASH_BITS].ravel()
+    # 直流分量只反映整体亮度，不参与比较
+    bits = coeffs > np.median(coeffs[1:])
+    return int(np.packbits(bits).view(">i8")[0])
+
+
+def hamming(hashes, value):
+    """一组哈希与 value 的汉明距离"""
+    diff = (np.asarray(hashes, dtype=np.int64) ^ np.int64(value)).view(np.uint8)
+    return np.unpackbits(diff).reshape(-1, 64).sum(axis=1)
+
+
+class PageHashIndex:
+    """相似页面索引：哈希 → 识别参数、发票代码/号码、OCR结果
+
+    每个进程在内存中保留一份哈希列表，每次查找前只读取其他进程新写入的行
+    """
+
+    def __init__(self, path=DEFAULT_PAGE_HASH_PATH, max_distance=MAX_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+        self._last_id = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._hashes = np.empty(0, dtype=np.int64)
+        self._settings = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _refresh(self):
+        records = self._conn.execute(
+            "SELECT id, phash, settings FROM pages WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+        if not records:
+            return
+        self._ids = np.concatenate([self._ids, np.array([r["id"] for r in records], dtype=np.int64)])
+        self._hashes = np.concatenate([self._hashes, np.array([r["phash"] for r in records], dtype=np.int64)])
+        self._settings.extend(r["settings"] for r in records)
+        self._last_id = records[-1]["id"]
+
+    def nearby(self, value, settings):
+        """识别参数相同、哈希距离不超过 max_distance 的页面id，按距离从近到远排列"""
+        settings = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            self._refresh()
+            if not len(self._ids):
+                return []
+            distances = hamming(self._hashes, value)
+            return [int(self._ids[i]) for i in np.argsort(distances, kind="stable")
+                    if distances[i] <= self.max_distance and self._settings[i] == settings]
+
+    def match(self, ids, key):
+        """在 nearby 找到的页面中取发票代码/号码与 key 一致的最近一页，返回 {source_path, page, result} 或None"""
+        with self._lock:
+            for page_id in ids:
+                record = self._conn.execute(
+                    "SELECT source_path, page, result_json FROM pages"
+                    " WHERE id = ? AND invoice_code = ? AND invoice_number = ?", (page_id, *key)).fetchone()
+                if record is not None:
+                    return {"source_path": record["source_path"], "page": record["page"],
+                            "result": json.loads(record["result_json"])}
+        return None
+
+    def add(self, value, settings, key, result, source_path, page):
+        """登记一页；同一来源、同一识别参数再次登记时覆盖旧记录"""
+        values = (
+            value, json.dumps(settings, sort_keys=True, ensure_ascii=False), key[0], key[1],
+            os.path.abspath(source_path), page, datetime.now().isoformat(timespec="seconds"),
+            json.dumps(result, ensure_ascii=False),
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (phash, settings, invoice_code, invoice_number, source_path, page,"
+                " created_at, result_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
@@ -0,0 +1,169 @@
+"""
+发票文本解析
+功能：各票据识别脚本的解析规则统一放在这里，按名称选择；
+      字段匹配全部交给预编译的提取引擎，版式匹配的页面按区域解析
+"""
+
+from .extraction import CLOUDCODE_234_EXTRACTOR, CLOUDCODE_EXTRACTOR, ENHANCED_EXTRACTOR
+from .layout import parse_invoice_regions
+
+
+# -------------------------- 解析规则 --------------------------
+def parse_enhanced(text, page_num):
+    """增强版发票信息解析（improved_ocr.py）"""
+    parsed_data = {
+        "票据序号": page_num + 1,
+        "票据类型": "",
+        "发票代码": "",
+        "发票号码": "",
+        "开票日期": "",
+        "购买方名称": "",
+        "购买方统一信用代码": "",
+        "销售方名称": "",
+        "销售方统一信用代码": "",
+        "项目名称": "",
+        "金额（不含税）": 0.0,
+        "税率(%)": 0.0,
+        "税额": 0.0,
+        "价税合计": 0.0,
+        "备注": ""
+    }
+
+    # 1. 发票类型（更灵活的匹配）
+    if "增值税专用发票" in text:
+        parsed_data["票据类型"] = "增值税专用发票"
+    elif "增值税普通发票" in text:
+        parsed_data["票据类型"] = "增值税普通发票"
+    elif "电子发票" in text or "电子" in text:
+        parsed_data["票据类型"] = "电子发票"
+    elif "通用机打发票" in text:
+        parsed_data["票据类型"] = "通用机打发票"
+
+    # 2~12. 其余字段：预编译的字段提取引擎按模式优先级取第一个有效匹配
+    parsed_data.update(ENHANCED_EXTRACTOR.extract(text))
+
+    # 计算逻辑：如果只有部分数据，尝试计算
+    if parsed_data["价税合计"] > 0:
+        if parsed_data["税额"] == 0 and parsed_data["税率(%)"] > 0:
+            # 已知价税合计和税率，计算税额
+            parsed_data["税额"] = round(parsed_data["价税合计"] / (1 + parsed_data["税率(%)"]/100) * (parsed_data["税率(%)"]/100), 2)
+        if parsed_data["金额（不含税）"] == 0:
+            # 已知价税合计和税额，计算不含税金额
+            parsed_data["金额（不含税）"] = round(parsed_data["价税合计"] - parsed_data["税额"], 2)
+
+    return parsed_data
+
+
+def parse_cloudcode(text, page_num):
+    """CloudCode版发票信息解析（cloudcode_ocr_345.py）"""
+    parsed_data = {
+        "票据序号": page_num + 1,
+        "购买方名称": "",
+        "购买方统一信用代码": "",
+        "销售方名称": "",
+        "销售方统一信用代码": "",
+        "票据类型": "",
+        "项目名称": "",
+        "金额（不含税）": 0.0,
+        "税率(%)": 0.0,
+        "税额": 0.0,
+        "价税合计": 0.0,
+        "备注": ""
+    }
+
+    # 发票类型
+    if "增值税专用发票" in text:
+        parsed_data["票据类型"] = "增值税专用发票"
+    elif "增值税普通发票" in text:
+        parsed_data["票据类型"] = "增值税普通发票"
+    elif "电子发票" in text:
+        parsed_data["票据类型"] = "电子发票"
+    elif "通用机打发票" in text:
+        parsed_data["票据类型"] = "通用机打发票"
+
+    # 各字段（预编译模式，匹配耗时与文本长度线性相关，并受单页时间预算限制）
+    parsed_data.update(CLOUDCODE_EXTRACTOR.extract(text))
+
+    # 如果没有金额但有价税合计和税额，计算金额
+    if parsed_data["金额（不含税）"] == 0 and parsed_data["价税合计"] > 0 and parsed_data["税额"] > 0:
+        parsed_data["金额（不含税）"] = round(parsed_data["价税合计"] - parsed_data["税额"], 2)
+
+    # 判断票据类型（基于项目名称）
+    if parsed_data["项目名称"]:
+        item_lower = parsed_data["项目名称"].lower()
+        if "运输" in item_lower or "客运" in item_lower or "滴滴" in item_lower:
+            parsed_data["票据类型"] = "运输服务"
+        elif "餐饮" in item_lower or "餐费" in item_lower:
+            parsed_data["票据类型"] = "餐饮服务"
+        elif "住宿" in item_lower or "酒店" in item_lower:
+            parsed_data["票据类型"] = "住宿服务"
+        elif "食品" in item_lower or "烘焙" in item_lower or "商品" in item_lower:
+            parsed_data["票据类型"] = "商品采购"
+
+    return parsed_data
+
+
+def parse_cloudcode_234(text, page_num):
+    """CloudCode版发票信息解析（cloudcode_ocr_234.py）"""
+    info = {
+        "票据序号": page_num + 1,
+        "购买方名称": "",
+        "购买方统一信用代码": "",
+        "销售方名称": "",
+        "销售方统一信用代码": "",
+        "票据类型": "电子发票",
+        "项目名称": "",
+        "金额（不含税）": 0.0,
+        "税率(%)": 0.0,
+        "税额": 0.0,
+        "价税合计": 0.0,
+        "备注": ""
+    }
+
+    # 发票类型
+    if "增值税专用发票" in text:
+        info["票据类型"] = "增值税专用发票"
+    elif "增值税普通发票" in text:
+        info["票据类型"] = "增值税普通发票"
+    elif "电子发票" in text:
+        info["票据类型"] = "电子发票"
+
+    # 各字段（预编译模式，匹配耗时与文本长度线性相关，并受单页时间预算限制）
+    info.update(CLOUDCODE_234_EXTRACTOR.extract(text))
+
+    # 金额（不含税）
+    if info["价税合计"] > 0 and info["税额"] > 0:
+        info["金额（不含税）"] = round(info["价税合计"] - info["税额"], 2)
+
+    return info
+
+
+# -------------------------- 按名称选择 --------------------------
+# separator 为拼接一页OCR文本片段时使用的分隔符，zoom 为默认渲染缩放比例，均与各解析规则调校时一致；
+# invoice_key 表示解析结果含发票代码/号码（发票库只能按号码去重）
+PARSERS = {
+    "enhanced": {"parse": parse_enhanced, "separator": " | ", "zoom": 3, "invoice_key": True},
+    "cloudcode": {"parse": parse_cloudcode, "separator": "\n", "zoom": 2, "invoice_key": False},
+    "cloudcode_234": {"parse": parse_cloudcode_234, "separator": "\n", "zoom": 2, "invoice_key": False},
+}
+DEFAULT_PARSER = "enhanced"
+
+
+def get_parser(name):
+    """按名称获取解析规则"""
+    try:
+        return PARSERS[name]
+    except KeyError:
+        raise ValueError(f"未知的解析规则: {name}，可选: {', '.join(PARSERS)}") from None
+
+
+def page_text(result, parser=DEFAULT_PARSER):
+    """把一页OCR结果的文本片段按解析规则要求的分隔符拼接"""
+    return get_parser(parser)["separator"].join(t for t in result["rec_texts"] if t)
+
+
+def parse_result(result, page_num, parser=DEFAULT_PARSER):
+    """解析一页OCR结果：版式匹配时按区域定位字段，否则整页正则解析"""
+    if result.get("regions"):
+        return parse_invoice_regions(result["regions"], page_num)
+    return get_parser(parser)["parse"](page_text(result, parser), page_num)
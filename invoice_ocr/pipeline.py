@@ -0,0 +1,77 @@
+"""
+流式处理流水线
+功能：把"渲染/OCR → 解析 → 输出"串成并发阶段，阶段之间用有界队列衔接，
+      第一页完成后即可产出结果，内存占用与总页数无关
+"""
+
+import queue
+import threading
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_QUEUE_SIZE = 4  # 每个阶段最多缓冲的元素数
+
+_DONE = object()
+
+
+class _StageError:
+    """包装阶段线程中抛出的异常，交给消费方重新抛出"""
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def _put(out_queue, item, stop_event):
+    """向有界队列放入元素；消费方已停止时放弃，避免线程永久阻塞"""
+    while not stop_event.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iter_stage(source, func=None, maxsize=DEFAULT_QUEUE_SIZE, name="stage"):
+    """在后台线程中对 source 的每个元素执行 func，通过有界队列按原顺序逐个产出结果
+
+    source 可以是另一个 iter_stage 的输出，从而串成多级流水线；
+    func 为 None 时只做预取（把 source 放到独立线程中提前运行）
+    """
+    out_queue = queue.Queue(maxsize=maxsize)
+    stop_event = threading.Event()
+
+    def worker():
+        try:
+            for item in source:
+                if not _put(out_queue, func(item) if func else item, stop_event):
+                    return
+        except BaseException as e:  # 原样转交给消费方
+            _put(out_queue, _StageError(e), stop_event)
+            return
+        _put(out_queue, _DONE, stop_event)
+
+    thread = threading.Thread(target=worker, name=f"pipeline-{name}", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = out_queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop_event.set()
+
+
+def run_pipeline(source, *stages, maxsize=DEFAULT_QUEUE_SIZE):
+    """依次串联多个处理函数，每个函数运行在独立线程中，逐个产出最终结果
+
+    stages 中的元素可以是函数，也可以是 (名称, 函数) 元组
+    """
+    stream = iter_stage(source, maxsize=maxsize, name="source")
+    for stage in stages:
+        name, func = stage if isinstance(stage, tuple) else (getattr(stage, "__name__", "stage"), stage)
+        stream = iter_stage(stream, func, maxsize=maxsize, name=name)
+    return stream
@@ -0,0 +1,225 @@
+"""
+票据识别流水线
+功能：渲染 → OCR → 解析 → 导出 的统一入口；一个处理器内所有输入文件共用同一个OCR引擎和结果缓存，
+      模型只加载一次，票据序号跨文件连续编号；启用任务日志时逐页落盘，中断后重新运行从断点继续；
+      启用发票库时每张发票写入库中，其他文件中已入库的发票在OCR之前跳过
+"""
+
+import os
+
+from .cache import DEFAULT_CACHE_DIR, OCRCache
+from .engine import SOURCE_DUPLICATE, SOURCE_LABELS, OCREngine
+from .export import ExcelWriter, write_excel
+from .journal import PageJournal
+from .parsing import DEFAULT_PARSER, get_parser, parse_result
+from .pipeline import run_pipeline
+from .store import InvoiceStore
+
+# -------------------------- 配置参数 --------------------------
+SOURCE_FILE_KEY = "来源文件"  # 每行记录所属的输入文件名
+DEBUG_SCORE_THRESHOLD = 0.3  # 调试文件中只保留置信度高于此值的文本
+
+
+class InvoiceProcessor:
+    """票据识别处理器
+
+    parser 为解析规则名称（见 parsing.PARSERS），导出时使用同名报表版式；
+    zoom 为None时使用解析规则的默认缩放比例；template 为版式模板名称，None表示整页识别；
+    debug_path 不为None时，把每页原始OCR文本写入该文件；
+    journal_dir 不为None时，每页的OCR和解析结果写入该目录下的任务日志，同一文档再次处理时跳过已完成的页面；
+    server 为常驻OCR服务地址时不在本地加载模型（见 service.py）；
+    columnar_dir 不为None时，每页的解析结果和OCR文本行同时追加到该列式数据集（见 columnar.py）；
+    store_path 不为None时，解析结果写入该发票库，库中已有（来自其他文件或页面）的发票跳过，不产出行（见 store.py）；
+    page_hash_path 不为None时，近似重复的扫描页面复用此前的OCR结果（见 page_hash.py）；
+    backend 为自定义OCR后端（见 OCREngine），None表示使用PaddleOCR
+    """
+
+    def __init__(self, parser=DEFAULT_PARSER, workers=None, zoom=None, cache_dir=DEFAULT_CACHE_DIR,
+                 use_text_layer=True, adaptive_zoom=None, template=None, debug_path=None,
+                 journal_dir=None, server=None, columnar_dir=None, columnar_format="parquet", store_path=None,
+                 page_hash_path=None, backend=None):
+        self.parser = parser
+        self.template = template
+        self.debug_path = debug_path
+        self.journal_dir = journal_dir
+        cache = OCRCache(cache_dir) if cache_dir else None
+        # 先在主进程建库，工作进程启动时库和表已存在
+        self.store = InvoiceStore(store_path) if store_path else None
+        # OCR前查库需要先识别票头号码，只有解析结果（或版式模板）带发票号码时才值得多这一步
+        probe_store = store_path if template or get_parser(parser)["invoice_key"] else None
+        self.engine = OCREngine(workers=workers, zoom=zoom or get_parser(parser)["zoom"], cache=cache,
+                                use_text_layer=use_text_layer, adaptive_zoom=adaptive_zoom, server=server,
+                                store_path=probe_store, page_hash_path=page_hash_path, backend=backend)
+        self.page_offset = 0  # 已分配的票据序号数
+        self._debug_file = None
+        self._columnar = None
+        if columnar_dir:
+            from .columnar import ColumnarDataset  # 可选依赖 pyarrow
+            self._columnar = ColumnarDataset(columnar_dir, columnar_format)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(discard_columnar=exc_type is not None)
+
+    def close(self, discard_columnar=False):
+        """关闭OCR引擎、调试文件和发票库，提交列式数据集的分片
+
+        discard_columnar 为True（处理中途出错）时丢弃本次写入的分片：启用任务日志时重新运行会从日志补齐，
+        不会在数据集中留下半份文档
+        """
+        self.engine.close()
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+        if self._debug_file is not None:
+            self._debug_file.close()
+            self._debug_file = None
+        if self._columnar is not None:
+            if discard_columnar:
+                self._columnar.abort()
+            else:
+                self._columnar.commit()
+            self._columnar = None
+
+    def _write_debug(self, page_num, result):
+        """把一页原始OCR文本追加到调试文件"""
+        if self.debug_path is None:
+            return
+        if self._debug_file is None:
+            self._debug_file = open(self.debug_path, 'w', encoding='utf-8')
+
+        lines = [f"{text} (置信度:{score:.2f})"
+                 for text, score in zip(result['rec_texts'], result['rec_scores'])
+                 if text and score > DEBUG_SCORE_THRESHOLD]
+        body = "\n".join(lines) if result['rec_texts'] else "识别失败"
+        self._debug_file.write(f"===== 第{page_num + 1}页 =====\n{body}\n\n")
+
+    def _journal_settings(self):
+        """影响识别和解析结果的参数，参数不同的运行使用不同的任务日志"""
+        return {"parser": self.parser, "lang": self.engine.lang, "zoom": self.engine.zoom,
+                "adaptive": self.engine.adaptive, "template": self.template,
+                "text_layer": self.engine.use_text_layer}
+
+    def iter_ocr(self, pdf_path, pages=None):
+        """逐页产出 (页序号, OCR结果)；pages 为要识别的页序号，None表示全部
+
+        启用版式模板且版式匹配时，结果的 regions 字段为各区域识别结果
+        """
+        page_count = self.engine.page_count(pdf_path)
+        pages = list(range(page_count)) if pages is None else list(pages)
+        print(f"  PDF共 {page_count} 页，使用 {self.engine.workers} 个OCR进程")
+
+        if self.template:
+            results = self.engine.iter_pdf_regions(pdf_path, self.template, pages=pages)
+        else:
+            results = self.engine.iter_pdf(pdf_path, pages=pages)
+
+        for idx, result in zip(pages, results):
+            print(f"  已完成第 {idx + 1}/{page_count} 页")
+            if result['source'] == SOURCE_DUPLICATE:
+                print(f"    {SOURCE_LABELS[SOURCE_DUPLICATE]}")
+            elif result['rec_texts']:
+                print(f"    识别到 {len(result['rec_texts'])} 个文本片段{SOURCE_LABELS[result['source']]}")
+            else:
+                print(f"    识别失败")
+            yield idx, result
+
+        print(f"  {self.engine.report()}")
+
+    def is_duplicate(self, row, pdf_path, idx, result=None):
+        """把一页的解析结果写入发票库；发票已由其他来源入库（或OCR前已判定为重复）时打印提示并返回True
+
+        idx 为页序号（从0开始）
+        """
+        if result is not None and result['source'] == SOURCE_DUPLICATE:
+            record = result['duplicate']
+        elif self.store is not None and row is not None:
+            record = self.store.add(row, pdf_path, idx)
+        else:
+            return False
+        if record is None:
+            return False
+        print(f"  [WARNING] 第 {idx + 1} 页为重复发票，已跳过"
+              f"（已入库：{os.path.basename(record['source_path'])} 第 {record['page'] + 1} 页）")
+        return True
+
+    def iter_rows(self, pdf_path):
+        """逐页产出一份PDF的解析结果；OCR与解析运行在不同线程，识别完一页就解析一页
+
+        启用任务日志时，已完成的页面直接从日志恢复，新完成的页面解析后立即写入日志
+        （日志只在当前线程读写：解析线程在调用方提前结束时不会被等待，不能让它在日志关闭后再写入）；
+        启用发票库时重复发票不产出（票据序号仍按页编号，跳过的页留空号）
+        """
+        page_count = self.engine.page_count(pdf_path)
+        page_offset = self.page_offset
+        self.page_offset += page_count
+        source = os.path.basename(pdf_path)
+
+        journal = PageJournal(self.journal_dir, pdf_path, self._journal_settings()) if self.journal_dir else None
+        done = dict(journal.pages) if journal else {}
+        pending = [idx for idx in range(page_count) if idx not in done]
+        if done:
+            print(f"  断点续跑：已完成 {len(done)} 页，剩余 {len(pending)} 页")
+
+        def parse(page):
+            idx, result = page
+            if result['source'] == SOURCE_DUPLICATE:
+                return result, None
+            row = parse_result(result, page_offset + idx, self.parser)
+            row[SOURCE_FILE_KEY] = source
+            return result, row
+
+        stream = run_pipeline(self.iter_ocr(pdf_path, pending), ("parse", parse)) if pending else None
+        try:
+            for idx in range(page_count):
+                if idx in done:
+                    result, row = done[idx]["result"], done[idx]["row"]
+                    row["票据序号"] = page_offset + idx + 1
+                    row[SOURCE_FILE_KEY] = source
+                else:
+                    result, row = next(stream)
+                    if journal is not None and row is not None:
+                        journal.append(idx, result, row)
+                # 先写日志再入库：两步之间中断时，恢复的页面会在这里重新入库
+                if self.is_duplicate(row, pdf_path, idx, result):
+                    continue
+                self._write_debug(page_offset + idx, result)
+                if self._columnar is not None:
+                    self._columnar.add_page(row, result, source, idx + 1)
+                yield row
+        finally:
+            if stream is not None:
+                stream.close()
+            if journal is not None:
+                journal.close()
+
+    def process(self, pdf_paths):
+        """依次处理多份PDF，返回所有页面的解析结果"""
+        rows = []
+        for pdf_path in pdf_paths:
+            print(f"\n正在处理: {pdf_path}")
+            rows.extend(self.iter_rows(pdf_path))
+        return rows
+
+    def export(self, rows, output_path, title=None, with_source=False):
+        """按解析规则对应的版式导出Excel；with_source 为True时追加来源文件列"""
+        extra_headers = (SOURCE_FILE_KEY,) if with_source else ()
+        return write_excel(rows, output_path, layout=self.parser, title=title, extra_headers=extra_headers)
+
+    def open_report(self, output_path, title=None, with_source=False, total=None):
+        """按解析规则对应的版式打开流式Excel报表，逐行 append，close（或 with 结束）时保存"""
+        extra_headers = (SOURCE_FILE_KEY,) if with_source else ()
+        return ExcelWriter(output_path, layout=self.parser, title=title, extra_headers=extra_headers, total=total)
+
+    def process_to_excel(self, pdf_paths, output_path, title=None, with_source=False):
+        """依次处理多份PDF，解析完一页就写出一行，不在内存中保留结果；返回写出的行数"""
+        # 启用发票库时重复发票不写出，行数事先未知，由公式统计
+        total = None if self.store else sum(self.engine.page_count(pdf_path) for pdf_path in pdf_paths)
+        with self.open_report(output_path, title, with_source, total) as report:
+            for pdf_path in pdf_paths:
+                print(f"\n正在处理: {pdf_path}")
+                for row in self.iter_rows(pdf_path):
+                    report.append(row)
+        return report.row_count
@@ -0,0 +1,69 @@
+"""
+PDF页面渲染
+功能：将PyMuPDF渲染出的Pixmap像素缓冲区直接包装为numpy数组，省去PNG编码/解码往返；
+      读取图片文件为OCR输入数组
+
+OCR输入统一为BGR通道顺序（与PaddleOCR读取图片文件时一致），PDF页面和图片文件
+得到的同一页像素相同，缓存键也相同；RGB → BGR 只在 to_bgr 中转换
+"""
+
+import fitz  # PyMuPDF
+import numpy as np
+
+
+class PixmapArray(np.ndarray):
+    """持有Pixmap引用的numpy数组
+
+    samples_mv 只是指向Pixmap内存的视图，本身不持有Pixmap；
+    把Pixmap挂在数组上，保证数组（及其切片）存活期间像素缓冲区不会被释放
+    """
+    pixmap = None
+
+
+def pixmap_to_array(pix):
+    """将Pixmap包装为 (高, 宽, 3) 的RGB数组，不复制像素数据
+
+    - 带alpha通道时返回去掉alpha的视图（仍为零拷贝）
+    - 灰度图扩展为3通道（此时需要复制一次）
+    """
+    arr = np.ndarray(
+        shape=(pix.height, pix.width, pix.n),
+        dtype=np.uint8,
+        buffer=pix.samples_mv,
+        strides=(pix.stride, pix.n, 1),
+    ).view(PixmapArray)
+    arr.pixmap = pix
+
+    color_channels = pix.n - (1 if pix.alpha else 0)
+    if color_channels == 1:
+        return np.repeat(arr[:, :, :1], 3, axis=2)
+    return arr[:, :, :color_channels]
+
+
+def to_bgr(rgb):
+    """RGB数组转为连续的BGR数组（OCR输入的通道顺序）"""
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+def render_page(page, zoom, clip=None):
+    """将PDF页面按缩放比例渲染为BGR数组（不含alpha；Pixmap零拷贝包装后只在调换通道时复制一次）"""
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+    return to_bgr(pixmap_to_array(pix))
+
+
+def load_image(image_path):
+    """读取图片文件为BGR数组"""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        return to_bgr(np.array(img.convert('RGB')))
+
+
+def render_page_png(page, zoom):
+    """旧的渲染方式：PNG编码后再用PIL解码（仅用于基准对比）"""
+    import io
+    from PIL import Image
+
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    img = Image.open(io.BytesIO(pix.tobytes("png")))
+    return to_bgr(np.array(img))
@@ -0,0 +1,224 @@
+"""
+常驻OCR服务
+功能：服务进程只加载一次PaddleOCR模型，通过本机HTTP接口接收页面图片，
+      把多个客户端并发发来的图片合并成批推理，返回 rec_texts/rec_scores/rec_boxes；
+      客户端（OCRClient）不导入PaddleOCR，启动几乎没有开销
+
+--line-batch 模式下检测按页凑批，识别按文本行跨页凑批（见 line_recognition）
+
+接口：
+  GET  /health   服务状态、模型标识和请求统计
+  GET  /metrics  各微批调度器的批大小、排队等待、延迟分位数和吞吐，用于调整等待窗口
+  POST /predict  请求体为若干张图片的原始像素（uint8，按顺序拼接），
+                 请求头 X-Shapes 为各图片形状的JSON列表，如 [[1123, 794, 3]]；
+                 返回与图片一一对应的识别结果JSON列表
+"""
+
+import http.client
+import json
+import os
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from .batching import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT, MicroBatcher
+from .line_recognition import DEFAULT_MAX_LINES
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8868
+DEFAULT_TIMEOUT = 300  # 客户端等待一次请求的最长秒数
+
+
+# -------------------------- 服务端 --------------------------
+def _split_images(body, shapes):
+    """按形状把请求体切分为图片数组（不复制像素）"""
+    images, offset = [], 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        if offset + size > len(body):
+            raise ValueError("请求体长度与 X-Shapes 不符")
+        images.append(np.frombuffer(body, dtype=np.uint8, count=size, offset=offset).reshape(shape))
+        offset += size
+    if offset != len(body):
+        raise ValueError("请求体长度与 X-Shapes 不符")
+    return images
+
+
+class OCRService:
+    """OCR服务：一个模型实例 + 微批调度器
+
+    line_batch 为True时改用 LineRecognizer：max_batch_size 为每批检测的页面数，
+    max_lines 为每批识别的文本行数
+    """
+
+    def __init__(self, lang="ch", cpu_threads=None, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 max_wait=DEFAULT_MAX_WAIT, line_batch=False, max_lines=DEFAULT_MAX_LINES):
+        cpu_threads = cpu_threads or os.cpu_count() or 1
+        if line_batch:
+            from .line_recognition import LineRecognizer
+
+            if lang != "ch":
+                raise ValueError("文本行微批模式目前只支持 lang=ch 的检测/识别模型")
+            os.environ["OMP_NUM_THREADS"] = str(cpu_threads)
+            self.recognizer = LineRecognizer(cpu_threads, max_batch_size, max_lines, max_wait)
+            self.model = {"lang": lang, **self.recognizer.model}
+            self.batcher = None
+            self._predict = self.recognizer.predict
+        else:
+            from . import engine
+
+            engine._init_worker(lang, cpu_threads)
+            self.recognizer = None
+            self.model = engine._worker_model
+            self.batcher = MicroBatcher(engine._infer_batch, max_batch_size, max_wait, name="ocr-batcher")
+            self._predict = self.batcher.map
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def predict(self, images):
+        """识别若干张图片，与其他并发请求的图片（或文本行）合并推理"""
+        results = self._predict(images)
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["images"] += len(images)
+        return results
+
+    def health(self):
+        with self._stats_lock:
+            return {"status": "ok", "model": self.model, "stats": dict(self.stats)}
+
+    def metrics(self):
+        """各微批调度器的统计：page 为整页（或检测）批，line 为文本行识别批"""
+        if self.recognizer is not None:
+            metrics = self.recognizer.metrics()
+            return {"page": metrics["det"], "line": metrics["rec"]}
+        return {"page": self.batcher.metrics.snapshot()}
+
+    def summary(self):
+        """各调度器的一行文字摘要"""
+        if self.recognizer is not None:
+            return {"page": self.recognizer.det_batcher.metrics.summary(),
+                    "line": self.recognizer.rec_batcher.metrics.summary()}
+        return {"page": self.batcher.metrics.summary()}
+
+    def close(self):
+        if self.recognizer is not None:
+            self.recognizer.close()
+        else:
+            self.batcher.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 保持连接，客户端复用同一个TCP连接
+    service = None  # 由 serve() 注入
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.service.health())
+        elif self.path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {"error": f"未知接口: {self.path}"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"未知接口: {self.path}"})
+            return
+        try:
+            images = _split_images(body, json.loads(self.headers.get("X-Shapes", "[]")))
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        try:
+            self._send_json(200, self.service.predict(images))
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def log_message(self, format, *args):
+        pass  # 不逐条打印请求日志
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, lang="ch", cpu_threads=None,
+          max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT, line_batch=False,
+          max_lines=DEFAULT_MAX_LINES):
+    """启动OCR服务（阻塞，Ctrl-C退出，退出时打印微批统计）"""
+    print("正在加载OCR模型...")
+    service = OCRService(lang, cpu_threads, max_batch_size, max_wait, line_batch, max_lines)
+    handler = type("OCRHandler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    batching = (f"每批 {max_batch_size} 页 / {max_lines} 行" if line_batch else f"批大小 {max_batch_size}")
+    print(f"[OK] OCR服务已启动: http://{host}:{port}（{batching}，最长等待 {max_wait * 1000:.0f}ms）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止OCR服务...")
+    finally:
+        server.server_close()
+        service.close()
+        for name, summary in service.summary().items():
+            print(f"  {name}: {summary}")
+
+
+# -------------------------- 客户端 --------------------------
+class OCRClient:
+    """OCR服务客户端，predict 的调用方式与返回格式与 PaddleOCR.predict 一致
+
+    每个实例持有一个长连接，不是线程安全的；多进程/多线程各自创建实例
+    """
+
+    def __init__(self, url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=DEFAULT_TIMEOUT):
+        parts = urlsplit(url)
+        self.host = parts.hostname or DEFAULT_HOST
+        self.port = parts.port or DEFAULT_PORT
+        self.timeout = timeout
+        self._conn = None
+        self.model = self.health()["model"]
+
+    def _request(self, method, path, body=None, headers=None):
+        """发送请求；连接被服务端关闭时重连一次"""
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers=headers or {})
+                response = self._conn.getresponse()
+                payload = json.loads(response.read().decode('utf-8'))
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self.close()
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"OCR服务返回错误 {response.status}: {payload.get('error')}")
+        return payload
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def predict(self, images):
+        """识别一张或多张图片（BGR uint8 数组），返回结果字典列表"""
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        images = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        headers = {"X-Shapes": json.dumps([list(image.shape) for image in images]),
+                   "Content-Type": "application/octet-stream"}
+        return self._request("POST", "/predict", b"".join(image.tobytes() for image in images), headers)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
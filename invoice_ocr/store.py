@@ -0,0 +1,145 @@
+"""
+发票库（本地SQLite）
+功能：每次识别把解析出的发票写入本地库，发票代码 + 发票号码 唯一；重复提交的发票
+      在OCR之前就被识别出来跳过，不会再次识别、导出和报销
+
+索引：
+  (发票代码, 发票号码)   唯一索引，去重
+  购买方统一信用代码 / 销售方统一信用代码 / 开票日期   普通索引，供对账查询
+
+同一来源（同一文件的同一页）再次处理不算重复：重新运行同一批文件结果不变。
+库使用WAL模式，OCR工作进程可以在主进程写入的同时并发查询
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .extraction import to_date
+
+# -------------------------- 配置参数 --------------------------
+DEFAULT_STORE_PATH = ".invoice_store.db"
+BUSY_TIMEOUT = 30  # 等待其他连接释放写锁的秒数
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    invoice_code TEXT NOT NULL DEFAULT '',
+    invoice_number TEXT NOT NULL,
+    invoice_date TEXT,
+    invoice_type TEXT,
+    buyer_name TEXT,
+    buyer_tax_id TEXT,
+    seller_name TEXT,
+    seller_tax_id TEXT,
+    total REAL,
+    source_path TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    row_json TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_invoices_key ON invoices (invoice_code, invoice_number);
+CREATE INDEX IF NOT EXISTS idx_invoices_buyer ON invoices (buyer_tax_id);
+CREATE INDEX IF NOT EXISTS idx_invoices_seller ON invoices (seller_tax_id);
+CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (invoice_date);
+"""
+
+
+def invoice_key(row):
+    """解析结果的去重键 (发票代码, 发票号码)；没有识别出号码时返回None"""
+    number = str(row.get("发票号码") or "").strip()
+    if not number:
+        return None
+    return str(row.get("发票代码") or "").strip(), number
+
+
+class InvoiceStore:
+    """发票库连接；可在多个线程中使用（内部加锁）"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def find(self, key):
+        """按 (发票代码, 发票号码) 查找已入库的发票，返回 {source_path, page, ...} 或None"""
+        with self._lock:
+            record = self._conn.execute(
+                "SELECT source_path, page, invoice_date, seller_name, total, created_at FROM invoices"
+                " WHERE invoice_code = ? AND invoice_number = ?", key).fetchone()
+        return dict(record) if record else None
+
+    def find_duplicate(self, key, source_path, page):
+        """key 已由其他来源入库时返回该记录，否则（未入库或就是同一来源）返回None"""
+        record = self.find(key)
+        if record and (record["source_path"], record["page"]) != (os.path.abspath(source_path), page):
+            return record
+        return None
+
+    def add(self, row, source_path, page):
+        """写入一张发票；page 为页序号（从0开始）
+
+        返回None表示已写入（或同一来源重复写入），返回已有记录表示这是其他来源已入库的重复发票；
+        没有发票号码的行不入库，也不算重复
+        """
+        key = invoice_key(row)
+        if key is None:
+            return None
+        invoice_date = to_date(row.get("开票日期"))
+        values = (
+            key[0], key[1], invoice_date.isoformat() if invoice_date else None, row.get("票据类型"),
+            row.get("购买方名称"), row.get("购买方统一信用代码"),
+            row.get("销售方名称"), row.get("销售方统一信用代码"), row.get("价税合计"),
+            os.path.abspath(source_path), page, datetime.now().isoformat(timespec="seconds"),
+            json.dumps(row, ensure_ascii=False),
+        )
+        with self._lock, self._conn:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO invoices (invoice_code, invoice_number, invoice_date, invoice_type,"
+                " buyer_name, buyer_tax_id, seller_name, seller_tax_id, total, source_path, page, created_at, row_json)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", values).rowcount
+        if inserted:
+            return None
+        return self.find_duplicate(key, source_path, page)
+
+    def query(self, buyer_tax_id=None, seller_tax_id=None, date_from=None, date_to=None):
+        """按购买方/销售方统一信用代码、开票日期区间（含两端）查询，返回解析结果列表（走索引）"""
+        conditions, params = [], []
+        for column, value in (("buyer_tax_id", buyer_tax_id), ("seller_tax_id", seller_tax_id)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        for op, value in ((">=", date_from), ("<=", date_to)):
+            if value is not None:
+                conditions.append(f"invoice_date {op} ?")
+                params.append(to_date(value).isoformat())
+        sql = "SELECT row_json FROM invoices"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            records = self._conn.execute(sql + " ORDER BY invoice_date, id", params).fetchall()
+        return [json.loads(record["row_json"]) for record in records]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
@@ -0,0 +1,63 @@
+"""
+PDF文本层提取
+功能：电子发票等原生数字PDF自带文本层，直接读取即可得到与OCR结果同结构的
+      rec_texts/rec_scores/rec_boxes；仅扫描件才需要渲染并OCR
+"""
+
+import re
+
+# -------------------------- 配置参数 --------------------------
+MIN_TEXT_CHARS = 20        # 文本层至少包含的有效字符数
+MIN_VALID_RATIO = 0.9      # 可识别字符（中文/字母数字/常用标点）占比下限
+# 文本层中至少出现一个票据关键词，才认为文本层完整可用
+INVOICE_KEYWORDS = ("发票", "金额", "税额", "合计", "名称", "纳税人", "价税")
+
+_VALID_CHAR = re.compile(r'[\u4e00-\u9fa5\u3000-\u303f\uff00-\uffefA-Za-z0-9\s.,:;*()\[\]/%¥￥+\-<>#@&_]')
+
+
+def _iter_lines(page):
+    """按阅读顺序产出文本层中的每一行：(文本, 边界框)"""
+    text_dict = page.get_text("dict", sort=True)
+    for block in text_dict.get("blocks", []):
+        if block.get("type") != 0:  # 跳过图片块
+            continue
+        for line in block.get("lines", []):
+            text = "".join(span["text"] for span in line.get("spans", [])).strip()
+            if text:
+                yield text, line["bbox"]
+
+
+def is_text_layer_usable(texts):
+    """判断文本层是否可用：字数足够、无大量乱码、包含票据关键词"""
+    joined = "".join(texts)
+    chars = [c for c in joined if not c.isspace()]
+    if len(chars) < MIN_TEXT_CHARS:
+        return False
+
+    # 字体缺少ToUnicode映射时会提取出乱码，此时仍需OCR
+    valid = sum(1 for c in chars if _VALID_CHAR.match(c))
+    if valid / len(chars) < MIN_VALID_RATIO:
+        return False
+
+    return any(keyword in joined for keyword in INVOICE_KEYWORDS)
+
+
+def extract_text_layer(page, zoom=1.0):
+    """读取页面文本层，返回与OCR结果相同结构的字典；文本层不可用时返回None
+
+    rec_boxes 按 zoom 换算到渲染图片的像素坐标，便于与OCR结果混用
+    """
+    texts = []
+    boxes = []
+    for text, (x0, y0, x1, y1) in _iter_lines(page):
+        texts.append(text)
+        boxes.append([int(x0 * zoom), int(y0 * zoom), int(x1 * zoom), int(y1 * zoom)])
+
+    if not is_text_layer_usable(texts):
+        return None
+
+    return {
+        "rec_texts": texts,
+        "rec_scores": [1.0] * len(texts),  # 文本层内容是精确的
+        "rec_boxes": boxes,
+    }
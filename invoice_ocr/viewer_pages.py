@@ -0,0 +1,489 @@
+"""
+查看器页面渲染
+功能：票据查看器的两种渲染方式，接口一致（page_count / is_ready / focus / poll / load / close）：
+      PdfRenderer 直接从打开的PDF栅格化显示图块：每块只渲染它对应的页面区域，分辨率正好是显示所需，
+      不生成PNG缓存，也没有先高倍渲染再缩小的多余像素；
+      PageRenderer（旧方式）按需在后台进程池中把PDF页面渲染为4倍PNG（缓存到页面目录），
+      当前显示的页面优先，相邻页面预取，其余页面在空闲时依次补齐；
+      页面尚未渲染完成时先在当前进程按显示倍数直接渲染一张预览（不编码PNG），打开长文档也能立即显示第一页
+
+渲染结果经线程安全队列交回界面线程：界面线程定时调用 poll() 取回已完成的页面，
+不在工作线程中调用任何Tk接口；
+已载入的页面（PNG解码后的图像金字塔）、已生成的显示图块保存在按字节数限额的LRU缓存中，
+相邻页面由后台线程预先生成图块，来回翻页和点选表格行时不再重复读取、解码PNG；
+显示时只生成与Canvas可视区域相交的图块（TILE_SIZE 见方），PNG页面每块只从金字塔中分辨率最接近的一级取样，
+缩放、滚动的开销只与窗口大小有关，与页面大小和缩放比例无关；
+连续缩放时先用最近邻插值生成草图块，缩放停止后再由后台线程生成高质量图块替换
+"""
+
+import heapq
+import itertools
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+# -------------------------- 配置参数 --------------------------
+RENDER_ZOOM = 4.0  # PNG页面缓存的分辨率（与查看器原先一次性生成的图片一致）
+PREFETCH_PAGES = 2  # 当前页前后各预取的页数
+# 渲染进程数：至少留一个核心给界面
+DEFAULT_RENDER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+DEFAULT_CACHE_BYTES = 384 * 1024 * 1024  # 已解码页面图片缓存上限（4倍A4页面约24MB/页）
+TILE_SIZE = 256  # 显示图块边长（像素）
+DRAFT_RESAMPLE = Image.Resampling.NEAREST  # 连续缩放时草图块的插值方式（比LANCZOS快约7倍）
+DRAFT_SCALE = 0.5  # 直接渲染时草图块按显示分辨率的一半栅格化后放大
+
+# 渲染优先级：数值越小越先渲染
+PRIORITY_CURRENT = 0
+PRIORITY_NEIGHBOR = 1
+PRIORITY_BACKGROUND = 2
+
+# -------------------------- 工作进程 --------------------------
+_worker_doc = None
+
+
+def _init_render_worker(pdf_path):
+    """进程初始化：每个渲染进程只打开一次PDF"""
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+
+
+def _render_png(page_index, image_path, zoom):
+    """渲染一页并保存为PNG：先写临时文件再改名，界面不会读到写了一半的图片"""
+    pix = _worker_doc[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    tmp_path = f"{image_path}.tmp"
+    pix.save(tmp_path, output="png")
+    os.replace(tmp_path, image_path)
+    return page_index
+
+
+class PageRenderer:
+    """按优先级在后台渲染PDF页面的PNG缓存
+
+    只有界面线程调用本类的方法；进程池中同时最多 workers 个任务，
+    其余请求留在优先级队列中，当前页变化时新请求可以插到最前面
+    """
+
+    def __init__(self, pdf_path, cache_dir, zoom=RENDER_ZOOM, workers=DEFAULT_RENDER_WORKERS):
+        self.pdf_path = pdf_path
+        self.cache_dir = cache_dir
+        self.zoom = zoom
+        self.workers = workers
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 主进程也打开一份文档：读取页数、渲染预览
+        self._doc = fitz.open(pdf_path)
+        self.paths = [os.path.join(cache_dir, f"page_{i + 1}.png") for i in range(len(self._doc))]
+        self.ready = {i for i, path in enumerate(self.paths) if os.path.exists(path)}
+        self.failed = {}  # 页序号 → 错误信息
+
+        self._heap = []
+        self._priority = {}  # 排队中的页面 → 当前优先级
+        self._order = itertools.count()
+        self._running = set()
+        self._finished = queue.Queue()
+        self._executor = None
+        self.focus_page = None
+
+        for index in range(self.page_count):
+            self.request(index, PRIORITY_BACKGROUND)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def page_count(self):
+        return len(self.paths)
+
+    @property
+    def done(self):
+        """已有结果（渲染完成或出错）的页数"""
+        return len(self.ready) + len(self.failed)
+
+    def close(self):
+        """停止渲染：丢弃排队的任务，等正在渲染的几页完成（不等待时进程池在解释器退出时会报错）"""
+        self._heap.clear()
+        self._priority.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def is_ready(self, index):
+        return index in self.ready
+
+    def request(self, index, priority):
+        """请求渲染一页；已在排队的页面只会提高优先级"""
+        if not 0 <= index < self.page_count or index in self.ready or index in self.failed \
+                or index in self._running:
+            return
+        if self._priority.get(index, priority + 1) <= priority:
+            return
+        self._priority[index] = priority
+        # 背景任务按页序，同一优先级中后请求的排在前面（最近一次翻页的页面最急）
+        order = index if priority == PRIORITY_BACKGROUND else -next(self._order)
+        heapq.heappush(self._heap, (priority, order, index))
+
+    def focus(self, index):
+        """切换当前页：当前页最先渲染，前后 PREFETCH_PAGES 页随后"""
+        self.focus_page = index
+        for distance in range(PREFETCH_PAGES, 0, -1):
+            self.request(index + distance, PRIORITY_NEIGHBOR)
+            self.request(index - distance, PRIORITY_NEIGHBOR)
+        self.request(index, PRIORITY_CURRENT)
+        self._pump()
+
+    def load(self, index):
+        """载入一页已渲染的PNG（解码），返回 TiledPage"""
+        base = Image.open(self.paths[index])
+        base.load()
+        return TiledPage(base, self.zoom)
+
+    def preview(self, index, zoom):
+        """在当前进程按 zoom 倍直接渲染一张预览（PIL图片），供PNG就绪前显示"""
+        pix = self._doc[index].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    def _pump(self):
+        """从优先级队列向进程池补充任务，保持 workers 个任务在途"""
+        if self._executor is None and self._heap:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_render_worker, initargs=(self.pdf_path,))
+        while self._heap and len(self._running) < self.workers:
+            priority, _, index = heapq.heappop(self._heap)
+            if self._priority.get(index) != priority:
+                continue  # 已被更高优先级的请求取代
+            del self._priority[index]
+            self._running.add(index)
+            future = self._executor.submit(_render_png, index, self.paths[index], self.zoom)
+            future.add_done_callback(lambda f, i=index: self._finished.put((i, f)))
+
+    def poll(self):
+        """取回已完成的页面并继续派发任务，返回 [(页序号, 错误信息或None)]；由界面线程定时调用"""
+        finished = []
+        while True:
+            try:
+                index, future = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self._running.discard(index)
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is None:
+                self.ready.add(index)
+            else:
+                self.failed[index] = str(error)
+            finished.append((index, None if error is None else str(error)))
+        if self._executor is not None:
+            self._pump()
+        return finished
+
+
+def image_bytes(img):
+    """PIL图片解码后占用的内存字节数"""
+    return img.width * img.height * len(img.getbands())
+
+
+def _transposes(view):
+    """显示参数对应的PIL变换（先旋转再翻转，与 rotate(expand=True) 的结果一致）"""
+    _, rotation, flip_h, flip_v = view
+    ops = []
+    rotation %= 360
+    if rotation:
+        ops.append({90: Image.Transpose.ROTATE_90, 180: Image.Transpose.ROTATE_180,
+                    270: Image.Transpose.ROTATE_270}[rotation])
+    if flip_h:
+        ops.append(Image.Transpose.FLIP_LEFT_RIGHT)
+    if flip_v:
+        ops.append(Image.Transpose.FLIP_TOP_BOTTOM)
+    return ops
+
+
+def _source_box(box, width, height, view):
+    """显示图上的矩形 → 旋转、翻转前（width × height 的缩放页面）上的矩形"""
+    x0, y0, x1, y1 = box
+    rotation = view[1] % 360
+    out_width, out_height = (height, width) if rotation % 180 else (width, height)
+    if view[3]:
+        y0, y1 = out_height - y1, out_height - y0
+    if view[2]:
+        x0, x1 = out_width - x1, out_width - x0
+    if rotation == 90:
+        x0, y0, x1, y1 = width - y1, x0, width - y0, x1
+    elif rotation == 180:
+        x0, y0, x1, y1 = width - x1, height - y1, width - x0, height - y0
+    elif rotation == 270:
+        x0, y0, x1, y1 = y0, height - x1, y1, height - x0
+    return x0, y0, x1, y1
+
+
+class _PageTiles:
+    """按显示参数分块生成显示图的页面（TiledPage、PdfPage 的公共部分）
+
+    view 为 (缩放比例, 旋转角度, 水平翻转, 垂直翻转)，缩放比例相对于PDF原始尺寸，旋转角度为90的整数倍；
+    子类实现 scaled_size 和 _render（生成缩放后、旋转翻转前页面上的一块区域）
+    """
+
+    nbytes = 0  # 在图片缓存中计入的字节数
+
+    def size(self, view):
+        """显示图（缩放、旋转后）的尺寸"""
+        width, height = self.scaled_size(view[0])
+        return (height, width) if view[1] % 180 else (width, height)
+
+    def tiles(self, view, box):
+        """显示图上与矩形区域 box 相交的图块 [(列, 行)]"""
+        width, height = self.size(view)
+        x0, y0 = max(0, int(box[0])), max(0, int(box[1]))
+        x1, y1 = min(width, int(box[2])), min(height, int(box[3]))
+        return [(tx, ty) for ty in range(y0 // TILE_SIZE, -(-y1 // TILE_SIZE))
+                for tx in range(x0 // TILE_SIZE, -(-x1 // TILE_SIZE))]
+
+    def tile(self, view, tx, ty, resample=Image.Resampling.LANCZOS):
+        """生成一个显示图块：生成该块对应的页面区域（默认高质量），再旋转、翻转"""
+        scaled_width, scaled_height = self.scaled_size(view[0])
+        width, height = self.size(view)
+        box = (tx * TILE_SIZE, ty * TILE_SIZE, min((tx + 1) * TILE_SIZE, width), min((ty + 1) * TILE_SIZE, height))
+        img = self._render(view[0], _source_box(box, scaled_width, scaled_height, view), resample)
+        for op in _transposes(view):
+            img = img.transpose(op)
+        return img
+
+
+class TiledPage(_PageTiles):
+    """一页的图像金字塔：原图（按 base_zoom 倍渲染）逐级减半（按需生成），
+    每个图块从不小于显示尺寸的最小一级取样
+    """
+
+    def __init__(self, base, base_zoom):
+        self.base = base
+        self.base_zoom = base_zoom
+        self.levels = [base]
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """原图加上各级金字塔最多占用的字节数"""
+        return image_bytes(self.base) * 4 // 3
+
+    def scaled_size(self, zoom):
+        """按 zoom 缩放、旋转前的尺寸"""
+        return (int(int(self.base.width / self.base_zoom) * zoom),
+                int(int(self.base.height / self.base_zoom) * zoom))
+
+    def level(self, width):
+        """金字塔中宽度不小于 width 的最小一级；放大显示时为原图"""
+        with self._lock:
+            while self.levels[-1].width // 2 >= width:
+                self.levels.append(self.levels[-1].reduce(2))
+            for img in reversed(self.levels):
+                if img.width >= width:
+                    return img
+            return self.base
+
+    def _render(self, zoom, box, resample):
+        scaled_width, scaled_height = self.scaled_size(zoom)
+        x0, y0, x1, y1 = box
+        level = self.level(scaled_width)
+        fx, fy = level.width / scaled_width, level.height / scaled_height
+        return level.resize((x1 - x0, y1 - y0), resample, box=(x0 * fx, y0 * fy, x1 * fx, y1 * fy))
+
+
+class PdfPage(_PageTiles):
+    """直接从PDF栅格化的页面：每个图块按显示缩放比例只渲染它对应的页面区域（clip）
+
+    同一文档的各页共用一把锁：PyMuPDF不支持多线程同时访问，界面线程和预取线程轮流渲染
+    """
+
+    def __init__(self, page, lock):
+        self.page = page
+        self.width, self.height = page.rect.width, page.rect.height
+        self._lock = lock
+
+    def scaled_size(self, zoom):
+        return int(self.width * zoom), int(self.height * zoom)
+
+    def _render(self, zoom, box, resample):
+        # 草图块按较低分辨率栅格化再放大；高质量图块的分辨率正好是显示所需
+        scale = zoom if resample == Image.Resampling.LANCZOS else zoom * DRAFT_SCALE
+        x0, y0, x1, y1 = box
+        # clip 四周多留1像素，避免浮点误差在图块边缘少渲染一行
+        clip = fitz.Rect((x0 - 1) / zoom, (y0 - 1) / zoom, (x1 + 1) / zoom, (y1 + 1) / zoom) & self.page.rect
+        with self._lock:
+            pix = self.page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, alpha=False)
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        # 像素坐标以整页为原点，pix.x / pix.y 为这张pixmap在整页中的偏移
+        if scale == zoom:
+            return img.crop((x0 - pix.x, y0 - pix.y, x1 - pix.x, y1 - pix.y))
+        f = scale / zoom
+        return img.resize((x1 - x0, y1 - y0), resample,
+                          box=(x0 * f - pix.x, y0 * f - pix.y, x1 * f - pix.x, y1 * f - pix.y))
+
+
+class PdfRenderer:
+    """直接渲染方式：不生成PNG缓存，所有页面随时可以显示；接口与 PageRenderer 一致"""
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self._doc = fitz.open(pdf_path)
+        self._lock = threading.Lock()
+        self.focus_page = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def page_count(self):
+        return len(self._doc)
+
+    @property
+    def done(self):
+        return self.page_count
+
+    def close(self):
+        if self._doc is not None:
+            with self._lock:
+                self._doc.close()
+            self._doc = None
+
+    def is_ready(self, index):
+        # 翻到首页/末页时相邻页序号会越界（fitz 的负序号会取到末尾的页面）
+        return 0 <= index < self.page_count
+
+    def focus(self, index):
+        self.focus_page = index
+
+    def poll(self):
+        return []
+
+    def load(self, index):
+        """一页的 PdfPage"""
+        with self._lock:
+            page = self._doc[index]
+        return PdfPage(page, self._lock)
+
+
+class PageImages:
+    """已渲染页面的图片缓存
+
+    renderer 为 PageRenderer 或 PdfRenderer；
+    键为 (页序号, None) 的是 renderer.load() 载入的页面，(页序号, view, 列, 行) 的是显示图块；
+    总字节数超过 max_bytes 时淘汰最久未用的条目。界面线程和预取线程共用，由锁保护；
+    PIL的解码和缩放会释放GIL，预取线程不会卡住界面
+    """
+
+    def __init__(self, renderer, max_bytes=DEFAULT_CACHE_BYTES):
+        self.renderer = renderer
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # 键 → (图片, 字节数)
+        self._pending = {}  # 预取中的页序号 → Future
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-prefetch")
+
+    def close(self):
+        """取消排队的任务并等正在执行的任务结束；须在关闭 renderer 之前调用"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self.size = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _put(self, key, value, nbytes):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, nbytes)
+            self.size += nbytes
+            # 至少保留刚放入的这一项
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, (_, old_bytes) = self._entries.popitem(last=False)
+                self.size -= old_bytes
+
+    def _wait(self, index):
+        """预取线程正在处理该页时等它完成（比重新解码、缩放快），返回是否等待过"""
+        with self._lock:
+            future = self._pending.get(index)
+        if future is None:
+            return False
+        try:
+            future.result()
+        except Exception:
+            pass
+        return True
+
+    def page(self, index, wait=True):
+        """载入的页面（TiledPage 或 PdfPage）"""
+        key = (index, None)
+        page = self._get(key)
+        if page is None and wait and self._wait(index):
+            page = self._get(key)
+        if page is None:
+            page = self.renderer.load(index)
+            self._put(key, page, page.nbytes)
+        return page
+
+    def peek(self, index, view, tx, ty):
+        """已缓存的图块，没有时返回None（不生成）"""
+        return self._get((index, view, tx, ty))
+
+    def submit(self, fn, *args):
+        """在预取线程中执行后台任务（如缩放停止后生成高质量图块），返回Future
+
+        任务中调用 page()/tile() 时须传 wait=False：排在它后面的预取任务不会先完成
+        """
+        return self._executor.submit(fn, *args)
+
+    def tile(self, index, view, tx, ty, wait=True):
+        """页面在显示参数 view 下的一个图块"""
+        key = (index, view, tx, ty)
+        tile = self._get(key)
+        if tile is None and wait and self._wait(index):
+            tile = self._get(key)
+        if tile is None:
+            tile = self.page(index, wait).tile(view, tx, ty)
+            self._put(key, tile, image_bytes(tile))
+        return tile
+
+    def _prefetch(self, index, view, tiles):
+        # 预取任务自己就是 _pending 中的那个Future，不能等待它
+        self.page(index, wait=False)
+        for tx, ty in tiles:
+            self.tile(index, view, tx, ty, wait=False)
+
+    def prefetch(self, indices, view, tiles):
+        """在后台线程中载入页面并生成 tiles 中的图块（只处理已渲染的页面）"""
+        for index in indices:
+            if not self.renderer.is_ready(index):
+                continue
+            with self._lock:
+                if index in self._pending:
+                    continue
+                future = self._executor.submit(self._prefetch, index, view, tiles)
+                self._pending[index] = future
+            future.add_done_callback(lambda f, i=index: self._forget(i))
+
+    def _forget(self, index):
+        with self._lock:
+            self._pending.pop(index, None)
@@ -1,41 +1,80 @@
-from paddleocr import PaddleOCR
-import pandas as pd
+from invoice_ocr import OCRCache, OCREngine
+from invoice_ocr.image_batches import iter_image_batches, list_images
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from collections import deque
 import os
 
-# 1. 初始化 OCR（中英文）
-ocr = PaddleOCR(lang='ch')
-
 image_dir = "images"
-results = []
-
-# 2. 遍历图片
-for img_name in sorted(os.listdir(image_dir)):
-    if img_name.lower().endswith(('.png', '.jpg', '.jpeg')):
-        img_path = os.path.join(image_dir, img_name)
-        print(f"正在处理: {img_name}")
-        ocr_result = ocr.predict(img_path)
-
-        # 3. 提取识别文本
-        if ocr_result and len(ocr_result) > 0:
-            result = ocr_result[0]
-            texts = result.get('rec_texts', [])
-            scores = result.get('rec_scores', [])
-
-            for text, confidence in zip(texts, scores):
-                if text:  # 跳过空字符串
-                    results.append({
-                        "图片名": img_name,
-                        "识别文字": text,
-                        "置信度": confidence
-                    })
-                    print(f"  识别: {text} (置信度: {confidence:.3f})")
-
-# 4. 生成 Excel
 output_file = "识别结果.xlsx"
-if results:
-    df = pd.DataFrame(results)
-    df.to_excel(output_file, index=False)
-    print(f"\n[OK] 已成功生成 Excel：{output_file}，共 {len(results)} 条记录")
+BATCH_SIZE = 16   # 每批送入PaddleOCR的图片数
+OCR_WORKERS = 1   # 推理进程数
+OCR_SERVER = None  # 常驻OCR服务地址（python -m invoice_ocr serve），如 "http://127.0.0.1:8868"；None表示本地加载模型
+COLUMNAR_DIR = None  # 同时把文本行追加到该列式数据集目录（Parquet，需要 pyarrow），如 "ocr_dataset"；None表示只写Excel
+
+# 1. 初始化 OCR（中英文，识别结果按图片像素缓存，未变化的图片不再重复推理）
+ocr = OCREngine(workers=OCR_WORKERS, lang='ch', cache=OCRCache(".ocr_cache"), server=OCR_SERVER)
+
+# 2. 流式写入 Excel（只写模式，行写出后不再驻留内存）
+wb = Workbook(write_only=True)
+ws = wb.create_sheet("Sheet1")
+# 只写模式下列宽在写入第一行时就已输出，必须先于 append 设置
+for col, width in zip("ABC", (24, 40, 10)):
+    ws.column_dimensions[col].width = width
+header_font = Font(bold=True)
+header = []
+for name in ("图片名", "识别文字", "置信度"):
+    cell = WriteOnlyCell(ws, value=name)
+    cell.font = header_font
+    header.append(cell)
+ws.append(header)
+
+lines = None
+if COLUMNAR_DIR:
+    from invoice_ocr.columnar import LINE_COLUMNS, LINE_TABLE, ColumnarWriter, line_records
+    lines = ColumnarWriter(os.path.join(COLUMNAR_DIR, LINE_TABLE), LINE_COLUMNS)
+
+# 3. 按批读取图片（后台预取下一批）并批量识别
+img_names = list_images(image_dir)
+print(f"共 {len(img_names)} 张图片，每批 {BATCH_SIZE} 张")
+
+row_count = 0
+batches = iter_image_batches([os.path.join(image_dir, name) for name in img_names], BATCH_SIZE)
+batch_paths = deque()  # 已送入推理的各批图片路径，与推理结果按顺序一一对应
+
+
+def valid_batches():
+    """过滤掉读取失败的图片，记录每批对应的路径"""
+    for paths, images in batches:
+        ok = [(path, image) for path, image in zip(paths, images) if image is not None]
+        batch_paths.append([path for path, _ in ok])
+        yield [image for _, image in ok]
+
+
+for results in ocr.iter_batches(valid_batches()):
+    for img_path, result in zip(batch_paths.popleft(), results):
+        img_name = os.path.basename(img_path)
+        print(f"正在处理: {img_name}{'（缓存）' if result['source'] == 'cache' else ''}")
+        if lines is not None:
+            lines.extend(line_records(result, img_name, 1))
+
+        # 4. 提取识别文本，逐行写出
+        for text, confidence in zip(result['rec_texts'], result['rec_scores']):
+            if text:  # 跳过空字符串
+                ws.append([img_name, text, confidence])
+                row_count += 1
+                print(f"  识别: {text} (置信度: {confidence:.3f})")
+
+ocr.close()
+if lines is not None:
+    lines.commit()
+    print(f"[OK] 文本行已追加到列式数据集：{COLUMNAR_DIR}")
+
+# 5. 保存 Excel
+if row_count:
+    wb.save(output_file)
+    print(f"\n[OK] 已成功生成 Excel：{output_file}，共 {row_count} 条记录")
 
     # 自动打开 Excel 文件
     os.startfile(output_file)